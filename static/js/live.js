@@ -0,0 +1,89 @@
+// Patch car and driver pages from the /events/ Server-Sent Events stream.
+// Pages opt in with data-live-car (car detail) or data-live-list (lists).
+(function () {
+  "use strict";
+
+  var EVENTS_URL = "/events/";
+
+  function notice(text) {
+    var element = document.getElementById("live-notice");
+    if (element) {
+      element.textContent = text;
+      element.hidden = false;
+    }
+  }
+
+  function setFields(container, values) {
+    container.querySelectorAll("[data-live-field]").forEach(function (field) {
+      var name = field.getAttribute("data-live-field");
+      if (values[name] !== undefined) {
+        field.textContent = values[name];
+      }
+    });
+  }
+
+  function driverLabel(driver) {
+    return driver.username + " (" + driver.first_name + " " + driver.last_name + ")";
+  }
+
+  function watchCar(list) {
+    var carId = list.getAttribute("data-live-car");
+    var userId = list.getAttribute("data-user-id");
+    var source = new EventSource(EVENTS_URL + "?car=" + carId);
+
+    source.addEventListener("assignment", function (message) {
+      var event = JSON.parse(message.data);
+      var item = list.querySelector('[data-driver-id="' + event.driver.id + '"]');
+      if (event.action === "assigned" && !item) {
+        item = document.createElement("li");
+        item.setAttribute("data-driver-id", event.driver.id);
+        item.textContent = driverLabel(event.driver);
+        list.appendChild(item);
+      } else if (event.action === "unassigned" && item) {
+        item.remove();
+      }
+
+      var toggle = document.getElementById("toggle-assign");
+      if (toggle && String(event.driver.id) === userId) {
+        var assigned = event.action === "assigned";
+        toggle.className = "btn link-to-page " + (assigned ? "btn-danger" : "btn-success");
+        toggle.textContent = assigned ? "Delete me from this car" : "Assign me from this car";
+      }
+    });
+
+    source.addEventListener("car", function (message) {
+      var event = JSON.parse(message.data);
+      if (event.action === "deleted") {
+        notice("This car has been deleted.");
+        source.close();
+      } else {
+        setFields(document, event);
+      }
+    });
+  }
+
+  function watchList(table) {
+    var type = table.getAttribute("data-live-list");
+    var source = new EventSource(EVENTS_URL);
+
+    source.addEventListener(type, function (message) {
+      var event = JSON.parse(message.data);
+      var row = table.querySelector('[data-live-id="' + event[type] + '"]');
+      if (event.action === "created") {
+        notice("New " + type + "s were added. Reload to see them.");
+      } else if (row && event.action === "deleted") {
+        row.remove();
+      } else if (row) {
+        setFields(row, event);
+      }
+    });
+  }
+
+  document.addEventListener("DOMContentLoaded", function () {
+    if (!window.EventSource) {
+      return;
+    }
+    document.querySelectorAll("[data-live-car]").forEach(watchCar);
+    document.querySelectorAll("[data-live-list]").forEach(watchList);
+  });
+})();
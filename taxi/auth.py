@@ -0,0 +1,83 @@
+"""Authentication backend serving ``request.user`` from a cached snapshot.
+
+The snapshot holds the driver's column values and the ids of the cars they
+are assigned to (``assigned_car_ids``), read together with one query, so
+an authenticated request reads no user rows at all once it is warm. It is
+dropped by the receivers in ``taxi/signals.py`` whenever the driver row or
+their assignments change; a password change therefore logs out other
+sessions right away, and ``is_active``/``is_staff``/``is_superuser`` take
+effect on the next request. Individual permissions are not part of the
+snapshot and are looked up as usual.
+
+Snapshots live in the ``USER_CACHE`` cache for ``USER_CACHE_TIMEOUT``
+seconds. Processes only see each other's invalidations through a shared
+cache backend; with per-process caches the timeout bounds the staleness.
+"""
+import hashlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import transaction
+
+from taxi.models import Driver
+
+
+def user_cache():
+    return caches[settings.USER_CACHE]
+
+
+@lru_cache(maxsize=None)
+def _fields_fingerprint():
+    return hashlib.md5(",".join(_fields()).encode()).hexdigest()[:8]
+
+
+def snapshot_key(user_id):
+    # Snapshots store values by position; a schema change gets new keys,
+    # so snapshots cached by the previous deploy are never read.
+    return f"user:{_fields_fingerprint()}:{user_id}"
+
+
+def forget_users(user_ids):
+    """Drop the snapshots of ``user_ids`` now and again once the current
+    transaction commits, so a request that cached the old rows in between
+    does not keep them."""
+    keys = [snapshot_key(user_id) for user_id in set(user_ids)]
+    if not keys:
+        return
+    user_cache().delete_many(keys)
+    transaction.on_commit(lambda: user_cache().delete_many(keys))
+
+
+def _fields():
+    return [field.attname for field in Driver._meta.concrete_fields]
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        key = snapshot_key(user_id)
+        snapshot = user_cache().get(key)
+        if snapshot is None:
+            snapshot = self.load_snapshot(user_id)
+            if snapshot is None:
+                return None
+            user_cache().set(key, snapshot, settings.USER_CACHE_TIMEOUT)
+        values, car_ids = snapshot
+        user = Driver.from_db(Driver.objects.db, _fields(), values)
+        user.assigned_car_ids = car_ids
+        return user if self.user_can_authenticate(user) else None
+
+    @staticmethod
+    def load_snapshot(user_id):
+        """The driver's column values and car ids; the join returns one row
+        per car, or a single row with no car."""
+        rows = list(
+            Driver.objects.filter(pk=user_id).values_list(*_fields(), "cars")
+        )
+        if not rows:
+            return None
+        return (
+            list(rows[0][:-1]),
+            frozenset(row[-1] for row in rows if row[-1] is not None),
+        )
@@ -0,0 +1,99 @@
+"""Set-based bulk operations on cars and drivers.
+
+Every operation runs a fixed number of queries regardless of how many rows
+it touches and does its own bookkeeping (assignment history, live events,
+nearest-car index, report change log) instead of relying on per-row
+signals. Callers wrap them in a transaction.
+"""
+from itertools import product
+
+from django.db import transaction
+from django.db.models import F
+
+from taxi import events, reports
+from taxi.models import AssignmentEvent, Car, Driver
+from taxi.signals import CarDrivers, assignments_changed, bulk_delete
+from taxi.spatial import car_index
+
+
+def _existing_pairs(car_ids=None, driver_ids=None):
+    links = CarDrivers.objects.all()
+    if car_ids is not None:
+        links = links.filter(car_id__in=car_ids)
+    if driver_ids is not None:
+        links = links.filter(driver_id__in=driver_ids)
+    return links, list(links.values_list("car_id", "driver_id"))
+
+
+def _manufacturer_ids(car_ids):
+    return set(
+        Car.objects.filter(id__in=car_ids).values_list(
+            "manufacturer_id", flat=True
+        )
+    )
+
+
+def delete_cars(car_ids):
+    _, pairs = _existing_pairs(car_ids=car_ids)
+    assignments_changed(pairs, AssignmentEvent.UNASSIGNED)
+    reports.log_changes(manufacturer_ids=_manufacturer_ids(car_ids))
+    with bulk_delete():
+        deleted, _ = Car.objects.filter(id__in=car_ids).delete()
+    return deleted
+
+
+def delete_drivers(driver_ids):
+    _, pairs = _existing_pairs(driver_ids=driver_ids)
+    assignments_changed(pairs, AssignmentEvent.UNASSIGNED)
+    reports.log_changes(
+        deleted_drivers=Driver.objects.filter(id__in=driver_ids).values_list(
+            "id", flat=True
+        )
+    )
+    with bulk_delete():
+        deleted, _ = Driver.objects.filter(id__in=driver_ids).delete()
+    transaction.on_commit(
+        lambda: car_index.refresh_driver_counts({car for car, _ in pairs})
+    )
+    return deleted
+
+
+def change_manufacturer(car_ids, manufacturer):
+    reports.log_changes(
+        manufacturer_ids=_manufacturer_ids(car_ids) | {manufacturer.pk}
+    )
+    # Bump the versions so forms opened before the change do not
+    # silently revert it.
+    updated = Car.objects.filter(id__in=car_ids).update(
+        manufacturer=manufacturer, version=F("version") + 1
+    )
+
+    def after_commit():
+        car_index.set_manufacturer(car_ids, manufacturer.pk)
+        for car in Car.objects.filter(id__in=car_ids).only("id", "model"):
+            car.manufacturer = manufacturer
+            events.publish_car(car, "updated")
+
+    if events.broker.subscribers or car_index.built_at is not None:
+        transaction.on_commit(after_commit)
+    return updated
+
+
+def assign(car_ids, driver_ids):
+    _, existing = _existing_pairs(car_ids, driver_ids)
+    added = sorted(set(product(car_ids, driver_ids)) - set(existing))
+    CarDrivers.objects.bulk_create(
+        CarDrivers(car_id=car_id, driver_id=driver_id)
+        for car_id, driver_id in added
+    )
+    assignments_changed(added, AssignmentEvent.ASSIGNED)
+    transaction.on_commit(lambda: car_index.refresh_driver_counts(car_ids))
+    return len(added)
+
+
+def unassign(car_ids, driver_ids):
+    links, removed = _existing_pairs(car_ids, driver_ids)
+    links.delete()
+    assignments_changed(removed, AssignmentEvent.UNASSIGNED)
+    transaction.on_commit(lambda: car_index.refresh_driver_counts(car_ids))
+    return len(removed)
@@ -0,0 +1,210 @@
+"""Server-Sent Events stream of car, driver and assignment changes.
+
+Model signals publish events to an in-process broker once their
+transaction commits. ``EventStreamApp`` is a plain ASGI application mounted
+in front of Django (see ``taxi_service/asgi.py``): every client is a
+coroutine waiting on its own queue, so idle connections cost no thread.
+Events only reach clients connected to the same process.
+"""
+import asyncio
+import json
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections
+
+from taxi.models import Driver
+
+
+class EventBroker:
+    """Fan events out to subscriber queues; ``publish`` is thread-safe."""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self.subscribers = set()
+
+    def publish(self, event):
+        for loop, queue in list(self.subscribers):
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, event)
+            except RuntimeError:
+                # The subscriber's event loop is closed.
+                self.subscribers.discard((loop, queue))
+
+    @staticmethod
+    def _deliver(queue, event):
+        if queue.full():
+            # Slow client: drop its oldest event rather than block others.
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def subscribe(self):
+        subscriber = (
+            asyncio.get_running_loop(),
+            asyncio.Queue(self.queue_size),
+        )
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+
+broker = EventBroker()
+
+
+def publish_car(car, action):
+    if not broker.subscribers:
+        return
+    event = {"type": "car", "action": action, "car": car.pk}
+    if action != "deleted":
+        event["model"] = car.model
+        event["manufacturer"] = car.manufacturer.name
+    broker.publish(event)
+
+
+def publish_driver(driver, action):
+    if not broker.subscribers:
+        return
+    event = {"type": "driver", "action": action, "driver": driver.pk}
+    if action != "deleted":
+        event.update(
+            username=driver.username,
+            first_name=driver.first_name,
+            last_name=driver.last_name,
+            license_number=driver.license_number,
+        )
+    broker.publish(event)
+
+
+def publish_assignments(pairs, action):
+    if not broker.subscribers or not pairs:
+        return
+    drivers = {
+        driver["id"]: driver
+        for driver in Driver.objects.filter(
+            id__in={driver_id for _, driver_id in pairs}
+        ).values("id", "username", "first_name", "last_name")
+    }
+    for car_id, driver_id in pairs:
+        broker.publish({
+            "type": "assignment",
+            "action": action,
+            "car": car_id,
+            "driver": drivers.get(driver_id, {"id": driver_id}),
+        })
+
+
+def format_event(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode()
+
+
+def user_id_for_session(session_key):
+    """Resolve a session cookie the way ``AuthenticationMiddleware``
+    would; ``None`` for anonymous sessions."""
+    session_store = import_module(settings.SESSION_ENGINE).SessionStore
+    close_old_connections()
+    try:
+        request = SimpleNamespace(session=session_store(session_key))
+        return get_user(request).pk
+    finally:
+        close_old_connections()
+
+
+class EventStreamApp:
+    """Serve the event stream at ``path`` and pass other requests to
+    ``app``.
+
+    Logged-in users only. ``?car=<id>`` limits the stream to events about
+    that car.
+    """
+
+    def __init__(self, app, path="/events/", heartbeat=15):
+        self.app = app
+        self.path = path
+        self.heartbeat = heartbeat
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            return await self.app(scope, receive, send)
+
+        if await self.authenticate(scope) is None:
+            await send({
+                "type": "http.response.start",
+                "status": 403,
+                "headers": [(b"content-type", b"text/plain")],
+            })
+            await send({"type": "http.response.body", "body": b"Forbidden"})
+            return
+
+        query = parse_qs(scope.get("query_string", b"").decode())
+        car_id = query.get("car", [None])[0]
+        car_id = int(car_id) if car_id and car_id.isdigit() else None
+
+        subscriber = broker.subscribe()
+        disconnected = asyncio.ensure_future(self.wait_disconnect(receive))
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ],
+            })
+            await send({
+                "type": "http.response.body",
+                "body": b"retry: 5000\n\n",
+                "more_body": True,
+            })
+            await self.stream(subscriber[1], send, disconnected, car_id)
+        finally:
+            broker.unsubscribe(subscriber)
+            disconnected.cancel()
+
+    async def stream(self, queue, send, disconnected, car_id):
+        while not disconnected.done():
+            next_event = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {next_event, disconnected},
+                timeout=self.heartbeat,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if next_event not in done:
+                next_event.cancel()
+                if not done:
+                    await send({
+                        "type": "http.response.body",
+                        "body": b": keepalive\n\n",
+                        "more_body": True,
+                    })
+                continue
+            event = next_event.result()
+            if car_id is None or event.get("car") == car_id:
+                await send({
+                    "type": "http.response.body",
+                    "body": format_event(event),
+                    "more_body": True,
+                })
+
+    @staticmethod
+    async def wait_disconnect(receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    @staticmethod
+    async def authenticate(scope):
+        cookies = SimpleCookie()
+        for name, value in scope.get("headers", []):
+            if name == b"cookie":
+                cookies.load(value.decode("latin-1"))
+        morsel = cookies.get(settings.SESSION_COOKIE_NAME)
+        if morsel is None:
+            return None
+        return await sync_to_async(user_id_for_session)(morsel.value)
@@ -0,0 +1,114 @@
+"""Builders for realistic test data.
+
+Passwords are hashed once per process and the hash is reused for every
+driver, which removes the dominant cost of ``create_user`` in tests.
+``create_fleet`` inserts a whole fleet with a constant number of queries.
+"""
+import itertools
+import random
+from collections import namedtuple
+from functools import lru_cache
+
+from django.contrib.auth.hashers import make_password
+
+from taxi.models import Car, Driver, Manufacturer
+
+DEFAULT_PASSWORD = "test12345"
+
+MANUFACTURERS = (
+    ("Toyota", "Japan"),
+    ("Volkswagen", "Germany"),
+    ("Ford", "USA"),
+    ("Skoda", "Czech Republic"),
+    ("Hyundai", "South Korea"),
+    ("Renault", "France"),
+    ("Fiat", "Italy"),
+    ("Volvo", "Sweden"),
+)
+MODELS = ("Corolla", "Passat", "Focus", "Octavia", "Elantra", "Megane")
+FIRST_NAMES = ("Olena", "Taras", "Iryna", "Andrii", "Maria", "Dmytro")
+LAST_NAMES = ("Shevchenko", "Kovalenko", "Bondarenko", "Tkachenko")
+
+Fleet = namedtuple("Fleet", ["manufacturers", "cars", "drivers"])
+
+_sequence = itertools.count(1)
+
+
+@lru_cache(maxsize=None)
+def password_hash(password=DEFAULT_PASSWORD):
+    return make_password(password)
+
+
+def license_number(number):
+    letters = "".join(
+        chr(ord("A") + (number // 26 ** power) % 26) for power in (2, 1, 0)
+    )
+    return f"{letters}{number % 100000:05d}"
+
+
+def build_driver(password=DEFAULT_PASSWORD, **kwargs):
+    number = next(_sequence)
+    fields = {
+        "username": f"driver{number}",
+        "first_name": random.choice(FIRST_NAMES),
+        "last_name": random.choice(LAST_NAMES),
+        "license_number": license_number(number),
+        "password": password_hash(password),
+    }
+    fields.update(kwargs)
+    return Driver(**fields)
+
+
+def create_driver(**kwargs):
+    driver = build_driver(**kwargs)
+    driver.save()
+    return driver
+
+
+def create_manufacturer(**kwargs):
+    number = next(_sequence)
+    name, country = MANUFACTURERS[number % len(MANUFACTURERS)]
+    fields = {"name": f"{name} {number}", "country": country}
+    fields.update(kwargs)
+    return Manufacturer.objects.create(**fields)
+
+
+def create_car(drivers=(), **kwargs):
+    if "manufacturer" not in kwargs:
+        kwargs["manufacturer"] = create_manufacturer()
+    kwargs.setdefault("model", random.choice(MODELS))
+    car = Car.objects.create(**kwargs)
+    if drivers:
+        car.drivers.add(*drivers)
+    return car
+
+
+def create_fleet(
+    manufacturers=3, cars_per_manufacturer=4, drivers=6, drivers_per_car=2
+):
+    """Bulk-create manufacturers, their cars and drivers, and assign
+    ``drivers_per_car`` drivers to every car."""
+    manufacturer_objs = Manufacturer.objects.bulk_create(
+        Manufacturer(name=f"{name} {next(_sequence)}", country=country)
+        for name, country in itertools.islice(
+            itertools.cycle(MANUFACTURERS), manufacturers
+        )
+    )
+    car_objs = Car.objects.bulk_create(
+        Car(model=random.choice(MODELS), manufacturer=manufacturer)
+        for manufacturer in manufacturer_objs
+        for _ in range(cars_per_manufacturer)
+    )
+    driver_objs = Driver.objects.bulk_create(
+        build_driver() for _ in range(drivers)
+    )
+
+    if driver_objs:
+        Car.drivers.through.objects.bulk_create(
+            Car.drivers.through(car_id=car.pk, driver_id=driver.pk)
+            for car in car_objs
+            for driver in random.sample(
+                driver_objs, min(drivers_per_car, len(driver_objs))
+            )
+        )
+    return Fleet(manufacturer_objs, car_objs, driver_objs)
@@ -3,19 +3,84 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
 from django.core.exceptions import ValidationError
 
-from taxi.models import Car, Driver
+from taxi.models import Car, Driver, Manufacturer
 
 
-class CarForm(forms.ModelForm):
+class IdSetField(forms.Field):
+    """Primary keys as a set of ints in one comma-separated hidden input;
+    ``None`` if the input was not submitted at all."""
+
+    widget = forms.HiddenInput
+
+    def to_python(self, value):
+        if value is None:
+            return None
+        try:
+            return {int(pk) for pk in value.split(",") if pk}
+        except ValueError:
+            raise ValidationError("Invalid selection.")
+
+    def prepare_value(self, value):
+        if isinstance(value, (set, frozenset, list, tuple)):
+            return ",".join(str(pk) for pk in sorted(value))
+        return value
+
+
+class VersionedModelForm(forms.ModelForm):
+    """Sends the version of the row along, so that saving raises
+    ``VersionConflictError`` if the row changed since the form was shown."""
+
+    version = forms.IntegerField(required=False, widget=forms.HiddenInput)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.initial.setdefault("version", self.instance.version)
+        # Without it an update would overwrite whatever is saved now.
+        self.fields["version"].required = not self.instance._state.adding
+
+    def save(self, commit=True):
+        if self.cleaned_data.get("version") is not None:
+            self.instance.expect_version(self.cleaned_data["version"])
+        return super().save(commit)
+
+    def rebase(self, instance):
+        """An unbound form for the latest ``instance``, filled in with this
+        form's values, that saves them over the latest version."""
+        initial = dict(self.cleaned_data, version=instance.version)
+        return type(self)(instance=instance, initial=initial)
+
+
+class CarForm(VersionedModelForm):
     drivers = forms.ModelMultipleChoiceField(
         queryset=get_user_model().objects.all(),
         widget=forms.CheckboxSelectMultiple,
     )
+    drivers_seen = IdSetField(required=False)
 
     class Meta:
         model = Car
         fields = "__all__"
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.initial.setdefault(
+            "drivers_seen",
+            {driver.pk for driver in self.initial.get("drivers", [])},
+        )
+
+    def _save_m2m(self):
+        """Apply the drivers checked and unchecked since the form was shown
+        instead of replacing the whole set, so assignments made by others
+        meanwhile are kept and only the changed links are written."""
+        seen = self.cleaned_data.get("drivers_seen")
+        if seen is None:
+            return super()._save_m2m()
+        chosen = {driver.pk for driver in self.cleaned_data["drivers"]}
+        if seen - chosen:
+            self.instance.drivers.remove(*(seen - chosen))
+        if chosen - seen:
+            self.instance.drivers.add(*(chosen - seen))
+
 
 class DriverCreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
@@ -30,7 +95,7 @@ class DriverCreationForm(UserCreationForm):
         return validate_license_number(self.cleaned_data["license_number"])
 
 
-class DriverLicenseUpdateForm(forms.ModelForm):
+class DriverLicenseUpdateForm(VersionedModelForm):
     class Meta:
         model = Driver
         fields = ["license_number"]
@@ -39,6 +104,91 @@ class DriverLicenseUpdateForm(forms.ModelForm):
         return validate_license_number(self.cleaned_data["license_number"])
 
 
+class IdListField(forms.Field):
+    """Selected primary keys as a set of ints, without loading the rows."""
+
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        if not value:
+            return set()
+        try:
+            return {int(pk) for pk in value}
+        except (TypeError, ValueError):
+            raise ValidationError("Invalid selection.")
+
+
+class BulkActionForm(forms.Form):
+    ACTION_CHOICES = []
+    REQUIRED_FIELDS = {}
+
+    ids = IdListField(required=False)
+    action = forms.ChoiceField(widget=forms.HiddenInput)
+    confirm = forms.BooleanField(required=False, widget=forms.HiddenInput)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["action"].choices = self.ACTION_CHOICES
+
+    def clean(self):
+        cleaned_data = super().clean()
+        required = self.REQUIRED_FIELDS.get(cleaned_data.get("action"))
+        if (
+            required
+            and cleaned_data.get("confirm")
+            and not cleaned_data.get(required)
+        ):
+            self.add_error(required, "This field is required.")
+        return cleaned_data
+
+    @property
+    def parameter_field(self):
+        """The input the chosen action needs, if any."""
+        name = self.REQUIRED_FIELDS.get(self["action"].value())
+        return self[name] if name else None
+
+
+class CarBulkActionForm(BulkActionForm):
+    ACTION_CHOICES = [
+        ("delete", "Delete"),
+        ("change_manufacturer", "Change manufacturer"),
+        ("assign", "Assign drivers"),
+        ("unassign", "Unassign drivers"),
+    ]
+    REQUIRED_FIELDS = {
+        "change_manufacturer": "manufacturer",
+        "assign": "drivers",
+        "unassign": "drivers",
+    }
+
+    manufacturer = forms.ModelChoiceField(
+        queryset=Manufacturer.objects.all(), required=False
+    )
+    drivers = forms.ModelMultipleChoiceField(
+        queryset=get_user_model().objects.all(),
+        widget=forms.CheckboxSelectMultiple,
+        required=False,
+    )
+
+
+class DriverBulkActionForm(BulkActionForm):
+    ACTION_CHOICES = [
+        ("delete", "Delete"),
+        ("assign", "Assign to cars"),
+        ("unassign", "Unassign from cars"),
+    ]
+    REQUIRED_FIELDS = {
+        "assign": "cars",
+        "unassign": "cars",
+    }
+
+    cars = forms.ModelMultipleChoiceField(
+        queryset=Car.objects.select_related("manufacturer"),
+        widget=forms.CheckboxSelectMultiple,
+        required=False,
+    )
+
+
 def validate_license_number(
     license_number,
 ):  # regex validation is also possible here
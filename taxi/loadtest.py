@@ -0,0 +1,323 @@
+"""Load-testing harness behind ``manage.py loadtest``.
+
+``start_workers`` serves the WSGI application from pre-forked worker
+processes that accept connections on one shared listening socket, each
+handling requests in threads like ``runserver`` does. ``run_load`` drives
+it from asyncio clients speaking raw HTTP/1.1 over plain sockets: every
+client holds the session of one logged-in driver and keeps picking its next
+request from a weighted mix until the time is up. Latencies and errors are
+collected per request name in ``LatencyStats``.
+"""
+import asyncio
+import os
+import re
+import signal
+import socket
+import time
+from collections import Counter, defaultdict, namedtuple
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.urls import reverse
+
+from taxi.models import Car, Driver, Manufacturer
+
+# Upper bounds of the latency histogram buckets, in milliseconds.
+HISTOGRAM_BOUNDS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Toggles only pick from this many cars, so that concurrent clients assign
+# and unassign themselves to the same cars like parallel clicks would.
+HOT_CARS = 5
+
+Target = namedtuple("Target", ["host", "port"])
+Response = namedtuple("Response", ["status", "headers", "body"])
+Catalog = namedtuple(
+    "Catalog",
+    ["car_ids", "driver_ids", "car_terms", "driver_terms",
+     "manufacturer_terms"],
+)
+
+
+def _search(url_name, term):
+    return f"{reverse(url_name)}?{urlencode({'search': term})}"
+
+
+REQUESTS = {
+    "index": lambda rng, catalog: reverse("taxi:index"),
+    "car-list": lambda rng, catalog: reverse("taxi:car-list"),
+    "car-search": lambda rng, catalog: _search(
+        "taxi:car-list", rng.choice(catalog.car_terms)
+    ),
+    "car-detail": lambda rng, catalog: reverse(
+        "taxi:car-detail", args=[rng.choice(catalog.car_ids)]
+    ),
+    "driver-list": lambda rng, catalog: reverse("taxi:driver-list"),
+    "driver-search": lambda rng, catalog: _search(
+        "taxi:driver-list", rng.choice(catalog.driver_terms)
+    ),
+    "driver-detail": lambda rng, catalog: reverse(
+        "taxi:driver-detail", args=[rng.choice(catalog.driver_ids)]
+    ),
+    "manufacturer-list": lambda rng, catalog: reverse(
+        "taxi:manufacturer-list"
+    ),
+    "manufacturer-search": lambda rng, catalog: _search(
+        "taxi:manufacturer-list", rng.choice(catalog.manufacturer_terms)
+    ),
+    "toggle-car-assign": lambda rng, catalog: reverse(
+        "taxi:toggle-car-assign",
+        args=[rng.choice(catalog.car_ids[:HOT_CARS])],
+    ),
+}
+
+EXPECTED_STATUS = {"toggle-car-assign": 302}
+
+DEFAULT_MIX = {
+    "index": 5,
+    "car-list": 15,
+    "car-search": 10,
+    "car-detail": 20,
+    "driver-list": 10,
+    "driver-search": 5,
+    "driver-detail": 10,
+    "manufacturer-list": 10,
+    "manufacturer-search": 5,
+    "toggle-car-assign": 10,
+}
+
+
+def parse_mix(value):
+    """``"car-list=3,toggle-car-assign=1"`` -> ``{"car-list": 3, ...}``."""
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in REQUESTS:
+            raise ValueError(
+                f"Unknown request {name!r}; choose from "
+                f"{', '.join(REQUESTS)}."
+            )
+        mix[name] = float(weight) if weight else 1.0
+    return mix
+
+
+def load_catalog():
+    """Ids and search terms for the requests, taken from the database."""
+    return Catalog(
+        car_ids=list(Car.objects.order_by("id").values_list("id", flat=True)),
+        driver_ids=list(Driver.objects.values_list("id", flat=True)),
+        car_terms=sorted(set(Car.objects.values_list("model", flat=True))),
+        driver_terms=sorted(
+            set(Driver.objects.values_list("last_name", flat=True)) - {""}
+        ),
+        manufacturer_terms=sorted(
+            set(Manufacturer.objects.values_list("country", flat=True))
+        ),
+    )
+
+
+class LatencyStats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = Counter()
+
+    def add(self, seconds, error=None):
+        self.latencies.append(seconds)
+        if error:
+            self.errors[error] += 1
+
+    @property
+    def count(self):
+        return len(self.latencies)
+
+    def percentile(self, percent):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = round(percent / 100 * (len(ordered) - 1))
+        return ordered[index]
+
+    def histogram(self):
+        """Request counts per bucket of ``HISTOGRAM_BOUNDS``; the last
+        bucket holds everything slower."""
+        buckets = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+        for seconds in self.latencies:
+            milliseconds = seconds * 1000
+            index = next(
+                (
+                    index
+                    for index, bound in enumerate(HISTOGRAM_BOUNDS)
+                    if milliseconds <= bound
+                ),
+                len(HISTOGRAM_BOUNDS),
+            )
+            buckets[index] += 1
+        return buckets
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def _serve(listener, app):
+    server = ThreadedWSGIServer(
+        listener.getsockname(), QuietRequestHandler, bind_and_activate=False
+    )
+    server.socket.close()
+    server.socket = listener
+    host, port = listener.getsockname()[:2]
+    server.server_name = socket.getfqdn(host)
+    server.server_port = port
+    server.setup_environ()
+    server.set_app(app)
+    server.serve_forever()
+
+
+def start_workers(app, host="127.0.0.1", port=0, workers=4):
+    """Fork ``workers`` processes serving ``app``; return the address they
+    listen on and their pids.
+
+    Close database connections before calling this, the children must not
+    share them.
+    """
+    listener = socket.create_server((host, port), backlog=1024)
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _serve(listener, app)
+            finally:
+                os._exit(0)
+        pids.append(pid)
+    address = listener.getsockname()
+    listener.close()
+    return Target(address[0], address[1]), pids
+
+
+def stop_workers(pids):
+    for pid in pids:
+        os.kill(pid, signal.SIGTERM)
+    for pid in pids:
+        os.waitpid(pid, 0)
+
+
+def _cookies(response):
+    cookies = SimpleCookie()
+    for name, value in response.headers:
+        if name == "set-cookie":
+            cookies.load(value)
+    return {name: morsel.value for name, morsel in cookies.items()}
+
+
+class BadResponse(Exception):
+    """The server closed the connection without a complete response."""
+
+
+async def fetch(target, method, path, cookies=None, data=None, timeout=10):
+    """Send one request on a new connection and read the whole response."""
+    body = urlencode(data).encode() if data else b""
+    lines = [
+        f"{method} {path} HTTP/1.1",
+        f"Host: {target.host}:{target.port}",
+        "Connection: close",
+    ]
+    if cookies:
+        lines.append(
+            "Cookie: "
+            + "; ".join(f"{name}={value}" for name, value in cookies.items())
+        )
+    if data:
+        lines.append("Content-Type: application/x-www-form-urlencoded")
+        lines.append(f"Content-Length: {len(body)}")
+
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(target.host, target.port), timeout
+    )
+    try:
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        raw = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+
+    head, _, content = raw.partition(b"\r\n\r\n")
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    try:
+        status = int(status_line.split()[1])
+    except (IndexError, ValueError):
+        raise BadResponse(f"Unparsable status line {status_line!r}")
+    headers = [
+        (name.strip().lower(), value.strip())
+        for name, _, value in (line.partition(":") for line in header_lines)
+    ]
+    return Response(status, headers, content)
+
+
+async def log_in(target, username, password, timeout=30):
+    """Log in through the login form; return the session cookies."""
+    path = reverse("login")
+    form = await fetch(target, "GET", path, timeout=timeout)
+    cookies = _cookies(form)
+    token = re.search(
+        rb'name="csrfmiddlewaretoken" value="([^"]+)"', form.body
+    )
+    response = await fetch(
+        target,
+        "POST",
+        path,
+        cookies=cookies,
+        data={
+            "username": username,
+            "password": password,
+            "csrfmiddlewaretoken": token.group(1).decode() if token else "",
+        },
+        timeout=timeout,
+    )
+    cookies.update(_cookies(response))
+    if response.status != 302 or settings.SESSION_COOKIE_NAME not in cookies:
+        raise RuntimeError(
+            f"Logging in {username} failed with status {response.status}."
+        )
+    return cookies
+
+
+async def run_load(target, sessions, catalog, mix, duration, rng_factory,
+                   timeout=10):
+    """Replay ``mix`` from one client per session for ``duration``
+    seconds; return ``LatencyStats`` per request name and the elapsed
+    time."""
+    names, weights = list(mix), list(mix.values())
+    results = defaultdict(LatencyStats)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+
+    async def client(number, cookies):
+        rng = rng_factory(number)
+        while loop.time() < deadline:
+            name = rng.choices(names, weights)[0]
+            path = REQUESTS[name](rng, catalog)
+            started = time.perf_counter()
+            try:
+                response = await fetch(
+                    target, "GET", path, cookies, timeout=timeout
+                )
+            except (OSError, asyncio.TimeoutError) as error:
+                error = type(error).__name__
+            except BadResponse:
+                error = "bad-response"
+            else:
+                expected = EXPECTED_STATUS.get(name, 200)
+                error = (
+                    None if response.status == expected
+                    else str(response.status)
+                )
+            results[name].add(time.perf_counter() - started, error)
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(client(number, cookies) for number, cookies in enumerate(sessions))
+    )
+    return results, time.perf_counter() - started
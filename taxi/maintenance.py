@@ -0,0 +1,150 @@
+"""Chunked deletes for maintenance commands.
+
+SQLite lets one writer in at a time, so one large ``DELETE`` (or a cascade
+collected by ``Model.delete()``) blocks every request that writes, such as
+each visit to the index page updating its session. ``BatchRunner`` walks a
+queryset in primary key order and applies an operation to one batch per
+transaction instead. It times each transaction, which is how long the write
+lock was held, and resizes the next batch to stay under ``max_lock_ms``.
+It also pauses between batches so other writers get in, and stops once
+``max_seconds`` is used up. Because batches are keyed on the primary key, an
+interrupted run resumes where it left off the next time.
+"""
+import time
+from dataclasses import dataclass
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+@dataclass
+class BatchStats:
+    rows: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    max_lock_ms: float = 0.0
+    last_pk: object = None
+    finished: bool = False
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+class BatchRunner:
+    def __init__(self, batch_size=500, max_lock_ms=50, pause_ms=10,
+                 max_seconds=None, max_batch_size=50000, progress=None):
+        self.batch_size = batch_size
+        self.max_lock_ms = max_lock_ms
+        self.pause_ms = pause_ms
+        self.max_seconds = max_seconds
+        self.max_batch_size = max_batch_size
+        self.progress = progress
+
+    def resize(self, lock_ms):
+        """Aim the next batch at 80% of the lock limit, growing at most
+        twofold per batch."""
+        if lock_ms <= 0:
+            target = self.batch_size * 2
+        else:
+            target = self.batch_size * self.max_lock_ms * 0.8 / lock_ms
+        self.batch_size = int(
+            max(1, min(target, self.batch_size * 2, self.max_batch_size))
+        )
+
+    def run(self, queryset, operation):
+        """Call ``operation(pks)`` in a transaction for consecutive batches
+        of ``queryset``'s primary keys; it returns the rows it changed."""
+        stats = BatchStats()
+        started = time.perf_counter()
+        queryset = queryset.order_by("pk")
+        while (
+            self.max_seconds is None
+            or time.perf_counter() - started < self.max_seconds
+        ):
+            batch = queryset
+            if stats.last_pk is not None:
+                batch = batch.filter(pk__gt=stats.last_pk)
+            pks = list(
+                batch.values_list("pk", flat=True)[:self.batch_size]
+            )
+            if not pks:
+                stats.finished = True
+                break
+
+            lock_started = time.perf_counter()
+            with transaction.atomic():
+                stats.rows += operation(pks)
+            lock_ms = (time.perf_counter() - lock_started) * 1000
+
+            stats.batches += 1
+            stats.last_pk = pks[-1]
+            stats.max_lock_ms = max(stats.max_lock_ms, lock_ms)
+            stats.seconds = time.perf_counter() - started
+            if self.progress:
+                self.progress(stats, len(pks), lock_ms)
+            self.resize(lock_ms)
+            time.sleep(self.pause_ms / 1000)
+        stats.seconds = time.perf_counter() - started
+        return stats
+
+
+class BatchCommand(BaseCommand):
+    """Base for commands that change rows through ``BatchRunner``."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Rows in the first batch; later batches are resized.",
+        )
+        parser.add_argument(
+            "--max-lock-ms",
+            type=float,
+            default=50,
+            help="Longest a batch's transaction should hold the write lock.",
+        )
+        parser.add_argument(
+            "--pause-ms",
+            type=float,
+            default=10,
+            help="Pause between batches so other writers get in.",
+        )
+        parser.add_argument(
+            "--max-seconds",
+            type=float,
+            help="Stop after this long; the next run continues.",
+        )
+
+    def run_batches(self, label, queryset, operation, options):
+        runner = BatchRunner(
+            batch_size=options["batch_size"],
+            max_lock_ms=options["max_lock_ms"],
+            pause_ms=options["pause_ms"],
+            max_seconds=options["max_seconds"],
+            progress=self.report_progress if options["verbosity"] else None,
+        )
+        stats = runner.run(queryset, operation)
+        summary = (
+            f"{label}: {stats.rows} rows in {stats.batches} batches, "
+            f"{stats.seconds:.1f}s, {stats.rows_per_second:.0f} rows/s, "
+            f"longest lock {stats.max_lock_ms:.1f} ms"
+        )
+        if stats.finished:
+            self.stdout.write(self.style.SUCCESS(summary))
+        else:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{summary}; stopped at pk {stats.last_pk}, "
+                    "run again to continue"
+                )
+            )
+        return stats
+
+    def report_progress(self, stats, batch_size, lock_ms):
+        self.stdout.write(
+            f"  {stats.rows} rows, batch of {batch_size} held the lock "
+            f"{lock_ms:.1f} ms, {stats.rows_per_second:.0f} rows/s, "
+            f"at pk {stats.last_pk}"
+        )
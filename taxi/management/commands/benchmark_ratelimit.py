@@ -0,0 +1,78 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+
+from taxi.ratelimit import (
+    PERIODS,
+    check_rate,
+    request_buckets,
+    window_key,
+)
+
+# Never exhausted, and with a period long enough to span at most two
+# windows, whose keys are deleted afterwards.
+RATE = "1000000000/d"
+
+
+class Command(BaseCommand):
+    help = (  # noqa: VNE003
+        "Measure the cost of one rate limit check against the configured "
+        "RATE_LIMIT_CACHE, or the cache given with --cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=100000)
+        parser.add_argument("--clients", type=int, default=1000)
+        parser.add_argument(
+            "--cache",
+            default=settings.RATE_LIMIT_CACHE,
+            help="Alias of the cache to measure.",
+        )
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        cache = caches[options["cache"]]
+        requests = []
+        for number in range(options["clients"]):
+            request = RequestFactory().get(
+                "/", REMOTE_ADDR=f"10.0.{number // 256}.{number % 256}"
+            )
+            request.user = AnonymousUser()
+            requests.append(request)
+
+        # A name of its own keeps the buckets apart from live ones, which
+        # may share the cache.
+        name = f"benchmark-{uuid.uuid4().hex}"
+        first_window = int(time.time() // PERIODS["d"])
+        with override_settings(RATE_LIMIT_CACHE=options["cache"]):
+            started = time.perf_counter()
+            for iteration in range(iterations):
+                check_rate(requests[iteration % len(requests)], name, RATE)
+            elapsed = time.perf_counter() - started
+        last_window = int(time.time() // PERIODS["d"])
+        cache.delete_many([
+            window_key(key, window)
+            for request in requests
+            for key in request_buckets(request, name)
+            for window in range(first_window, last_window + 1)
+        ])
+
+        backend = type(cache)
+        self.stdout.write(
+            f"{options['cache']} ({backend.__module__}.{backend.__name__}): "
+            f"{iterations} checks in {elapsed:.3f}s, "
+            f"{elapsed / iterations * 1e6:.1f} microseconds per check"
+        )
+        if isinstance(cache, LocMemCache):
+            self.stdout.write(
+                self.style.WARNING(
+                    "This cache is per process and has no network round "
+                    "trips; measure the shared cache used in production."
+                )
+            )
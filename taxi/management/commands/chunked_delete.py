@@ -0,0 +1,49 @@
+from django.core.management.base import CommandError
+
+from taxi import bulk
+from taxi.maintenance import BatchCommand
+from taxi.models import Car, Driver, Manufacturer
+
+
+class Command(BatchCommand):
+    help = (  # noqa: VNE003
+        "Delete a manufacturer with its cars, or a driver with their "
+        "assignments. The dependent rows go in small batches first, so the "
+        "final delete only has a few rows left to cascade to."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", choices=["manufacturer", "driver"])
+        parser.add_argument("pk", type=int)
+        super().add_arguments(parser)
+
+    def handle(self, *args, **options):
+        model = Manufacturer if options["model"] == "manufacturer" else Driver
+        try:
+            instance = model.objects.get(pk=options["pk"])
+        except model.DoesNotExist:
+            raise CommandError(
+                f"{options['model'].capitalize()} {options['pk']} does not "
+                "exist."
+            )
+
+        if model is Manufacturer:
+            stats = self.run_batches(
+                "Cars",
+                Car.objects.filter(manufacturer=instance),
+                bulk.delete_cars,
+                options,
+            )
+        else:
+            stats = self.run_batches(
+                "Assignments",
+                Car.objects.filter(drivers=instance),
+                lambda car_ids: bulk.unassign(car_ids, [instance.pk]),
+                options,
+            )
+        if not stats.finished:
+            return
+        instance.delete()
+        self.stdout.write(
+            self.style.SUCCESS(f"Deleted {options['model']} {instance}.")
+        )
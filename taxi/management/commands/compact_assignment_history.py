@@ -0,0 +1,99 @@
+import json
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import (
+    BooleanField,
+    Exists,
+    ExpressionWrapper,
+    Q,
+)
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from taxi.models import AssignmentEvent
+
+
+class Command(BaseCommand):
+    help = (  # noqa: VNE003
+        "Archive assignment events older than a cutoff. Events that no "
+        "longer decide the state at or after the cutoff are exported and "
+        "deleted in primary key batches; the latest assignment of every "
+        "car/driver pair is kept, so as-of queries from the cutoff onwards "
+        "return the same results. SQLite has no table partitioning, so "
+        "running this periodically is what bounds the table size."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--before",
+            required=True,
+            help="Cutoff date or datetime in ISO 8601 format.",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--export",
+            help="Append deleted events to this file as JSON lines.",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = self.parse_cutoff(options["before"])
+        export = open(options["export"], "a") if options["export"] else None
+        last_id = 0
+        deleted = 0
+        try:
+            while True:
+                batch = self.next_batch(cutoff, last_id, options["batch_size"])
+                if not batch:
+                    break
+                last_id = batch[-1]["id"]
+                rows = [row for row in batch if row.pop("deletable")]
+                if export:
+                    for row in rows:
+                        export.write(json.dumps(row, default=str) + "\n")
+                AssignmentEvent.objects.filter(
+                    id__in=[row["id"] for row in rows]
+                ).delete()
+                deleted += len(rows)
+                self.stdout.write(f"Deleted {deleted} events, at id {last_id}")
+        finally:
+            if export:
+                export.close()
+        self.stdout.write(
+            self.style.SUCCESS(f"Archived {deleted} assignment events.")
+        )
+
+    @staticmethod
+    def parse_cutoff(value):
+        cutoff = parse_datetime(value)
+        if cutoff is None and parse_date(value):
+            cutoff = datetime.combine(parse_date(value), time.min)
+        if cutoff is None:
+            raise CommandError(f"Invalid --before value: {value!r}")
+        if timezone.is_naive(cutoff):
+            cutoff = timezone.make_aware(cutoff)
+        return cutoff
+
+    @staticmethod
+    def next_batch(cutoff, last_id, batch_size):
+        """Return the next batch of old events, flagging the ones that are
+        unassignments or superseded by a later event before the cutoff."""
+        superseded = AssignmentEvent.objects.superseding(
+            occurred_at__lt=cutoff
+        )
+        return list(
+            AssignmentEvent.objects.filter(
+                occurred_at__lt=cutoff, id__gt=last_id
+            )
+            .annotate(
+                deletable=ExpressionWrapper(
+                    Q(action=AssignmentEvent.UNASSIGNED) | Exists(superseded),
+                    output_field=BooleanField(),
+                )
+            )
+            .order_by("id")
+            .values(
+                "id", "car_id", "driver_id", "action", "occurred_at",
+                "deletable",
+            )[:batch_size]
+        )
@@ -0,0 +1,170 @@
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import get_internal_wsgi_application
+from django.db import connection, connections
+from django.test import override_settings
+
+from taxi import loadtest
+from taxi.factories import DEFAULT_PASSWORD, create_fleet
+
+
+class Command(BaseCommand):
+    help = (  # noqa: VNE003
+        "Serve the project from pre-forked worker processes on a throwaway "
+        "database, log in synthetic drivers and replay a weighted mix of "
+        "requests from concurrent clients. Reports throughput, latency "
+        "histograms and errors per request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument(
+            "--drivers",
+            type=int,
+            default=20,
+            help="Logged-in drivers, one concurrent client each.",
+        )
+        parser.add_argument(
+            "--duration", type=float, default=10, help="Seconds of load."
+        )
+        parser.add_argument("--manufacturers", type=int, default=10)
+        parser.add_argument("--cars-per-manufacturer", type=int, default=20)
+        parser.add_argument(
+            "--mix",
+            type=loadtest.parse_mix,
+            default=loadtest.DEFAULT_MIX,
+            help="Weighted requests, e.g. car-list=3,toggle-car-assign=1. "
+            f"Names: {', '.join(loadtest.REQUESTS)}.",
+        )
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=0)
+        parser.add_argument("--timeout", type=float, default=10)
+        parser.add_argument("--seed", type=int)
+        parser.add_argument(
+            "--rate-limits",
+            action="store_true",
+            help="Keep rate limiting on; all clients share one IP.",
+        )
+
+    def handle(self, *args, **options):
+        if not hasattr(os, "fork"):
+            raise CommandError("loadtest needs os.fork() to start workers.")
+
+        old_name = self.create_database()
+        try:
+            with override_settings(
+                DEBUG=False,
+                ALLOWED_HOSTS=[options["host"]],
+                QUERY_INSPECTION_ENABLED=False,
+                STARTUP_WARMUP=("urls", "templates", "database"),
+                RATE_LIMIT_ENABLED=options["rate_limits"],
+            ):
+                self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def create_database(self):
+        """Create and migrate a database for the run, like the test runner
+        does; SQLite gets a file so every worker sees the same data."""
+        old_name = connection.settings_dict["NAME"]
+        if connection.vendor == "sqlite":
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(
+                tempfile.mkdtemp(), "loadtest.sqlite3"
+            )
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        return old_name
+
+    def run(self, options):
+        seed = options["seed"]
+        fleet = create_fleet(
+            manufacturers=options["manufacturers"],
+            cars_per_manufacturer=options["cars_per_manufacturer"],
+            drivers=options["drivers"],
+        )
+        catalog = loadtest.load_catalog()
+        connections.close_all()
+
+        target, pids = loadtest.start_workers(
+            get_internal_wsgi_application(),
+            options["host"],
+            options["port"],
+            options["workers"],
+        )
+        try:
+            started = time.perf_counter()
+            sessions = asyncio.run(self.log_in(target, fleet.drivers))
+            self.stdout.write(
+                f"Logged in {len(sessions)} drivers on {options['workers']} "
+                f"workers in {time.perf_counter() - started:.1f}s."
+            )
+            results, elapsed = asyncio.run(
+                loadtest.run_load(
+                    target,
+                    sessions,
+                    catalog,
+                    options["mix"],
+                    options["duration"],
+                    lambda number: random.Random(
+                        None if seed is None else seed + number
+                    ),
+                    timeout=options["timeout"],
+                )
+            )
+        finally:
+            loadtest.stop_workers(pids)
+        self.report(results, elapsed)
+
+    @staticmethod
+    async def log_in(target, drivers):
+        return await asyncio.gather(
+            *(
+                loadtest.log_in(target, driver.username, DEFAULT_PASSWORD)
+                for driver in drivers
+            )
+        )
+
+    def report(self, results, elapsed):
+        total = sum(stats.count for stats in results.values())
+        errors = sum(sum(stats.errors.values()) for stats in results.values())
+        self.stdout.write(
+            f"\n{total} requests in {elapsed:.1f}s: "
+            f"{total / elapsed:.1f} requests/s, {errors} errors\n"
+        )
+        self.stdout.write(
+            f"{'request':<20} {'count':>6} {'req/s':>7} {'errors':>7} "
+            f"{'p50 ms':>7} {'p90 ms':>7} {'p99 ms':>7} {'max ms':>7}"
+        )
+        for name, stats in sorted(results.items()):
+            self.stdout.write(
+                f"{name:<20} {stats.count:>6} {stats.count / elapsed:>7.1f} "
+                f"{sum(stats.errors.values()):>7} "
+                + " ".join(
+                    f"{stats.percentile(percent) * 1000:>7.1f}"
+                    for percent in (50, 90, 99, 100)
+                )
+            )
+
+        bounds = [f"<={bound}" for bound in loadtest.HISTOGRAM_BOUNDS]
+        bounds.append(f">{loadtest.HISTOGRAM_BOUNDS[-1]}")
+        self.stdout.write("\nLatency histogram (ms)")
+        self.stdout.write(
+            f"{'request':<20} " + " ".join(f"{bound:>6}" for bound in bounds)
+        )
+        for name, stats in sorted(results.items()):
+            self.stdout.write(
+                f"{name:<20} "
+                + " ".join(f"{count:>6}" for count in stats.histogram())
+            )
+
+        for name, stats in sorted(results.items()):
+            for error, count in stats.errors.most_common():
+                self.stdout.write(
+                    self.style.ERROR(f"{name}: {count} x {error}")
+                )
@@ -0,0 +1,42 @@
+from django.db.models import Exists, OuterRef, Q
+
+from taxi.maintenance import BatchCommand
+from taxi.models import Car, Driver
+
+THROUGH_MODELS = (
+    Car.drivers.through,
+    Driver.groups.through,
+    Driver.user_permissions.through,
+)
+
+
+def orphans(through):
+    """Rows of ``through`` pointing at a row that no longer exists."""
+    missing = Q()
+    for field in through._meta.get_fields():
+        if field.many_to_one:
+            missing |= ~Exists(
+                field.related_model.objects.filter(
+                    pk=OuterRef(field.attname)
+                )
+            )
+    return through.objects.filter(missing)
+
+
+class Command(BatchCommand):
+    help = (  # noqa: VNE003
+        "Delete many-to-many rows of cars and drivers whose car, driver, "
+        "group or permission is gone, e.g. after imports run with foreign "
+        "key checks off. Works in small batches."
+    )
+
+    def handle(self, *args, **options):
+        for through in THROUGH_MODELS:
+            self.run_batches(
+                through._meta.db_table,
+                orphans(through),
+                lambda pks, through=through: through.objects.filter(
+                    pk__in=pks
+                ).delete()[0],
+                options,
+            )
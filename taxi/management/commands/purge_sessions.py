@@ -0,0 +1,19 @@
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+
+from taxi.maintenance import BatchCommand
+
+
+class Command(BatchCommand):
+    help = (  # noqa: VNE003
+        "Delete expired sessions in small batches. Unlike clearsessions "
+        "this never holds the database write lock for long."
+    )
+
+    def handle(self, *args, **options):
+        self.run_batches(
+            "Expired sessions",
+            Session.objects.filter(expire_date__lt=timezone.now()),
+            lambda pks: Session.objects.filter(pk__in=pks).delete()[0],
+            options,
+        )
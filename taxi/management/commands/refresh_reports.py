@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from taxi.reports import refresh_reports
+
+
+class Command(BaseCommand):
+    help = (  # noqa: VNE003
+        "Update the fleet report tables for manufacturers and countries "
+        "changed since the last run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Recompute every row instead of only the changed ones.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        manufacturers, countries = refresh_reports(full=options["full"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Refreshed {manufacturers} manufacturer and {countries} "
+                f"country rows in {time.perf_counter() - started:.2f}s."
+            )
+        )
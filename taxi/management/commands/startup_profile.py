@@ -0,0 +1,119 @@
+import json
+import os
+import subprocess
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from taxi.startup import parse_importtime
+
+# Prod refuses to start without these, but start-up never uses them; real
+# values in the environment take precedence.
+PLACEHOLDER_ENVIRON = {
+    "DJANGO_SECRET_KEY": "startup-profile-placeholder",
+    "DJANGO_REDIS_URL": "redis://localhost:6379",
+}
+
+
+class Command(BaseCommand):
+    help = (  # noqa: VNE003
+        "Start Django in a fresh interpreter the way a worker does and "
+        "report time spent per start-up phase, per app and per imported "
+        "module."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target-settings",
+            default="taxi_service.settings.prod",
+            help="Settings module to profile.",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=15,
+            help="How many packages and modules to list.",
+        )
+        parser.add_argument(
+            "--no-warmup",
+            action="store_true",
+            help="Skip the STARTUP_WARMUP steps.",
+        )
+
+    def handle(self, *args, **options):
+        command = [sys.executable, "-X", "importtime", "-m", "taxi.startup"]
+        if options["no_warmup"]:
+            command.append("--no-warmup")
+        process = subprocess.run(
+            command,
+            capture_output=True,
+            text=True,
+            cwd=settings.BASE_DIR,
+            env={
+                **PLACEHOLDER_ENVIRON,
+                **os.environ,
+                "DJANGO_SETTINGS_MODULE": options["target_settings"],
+            },
+        )
+        lines = process.stderr.splitlines()
+        if process.returncode:
+            errors = [
+                line for line in lines if not line.startswith("import time:")
+            ]
+            raise CommandError(
+                "Start-up failed:\n" + "\n".join(errors[-20:])
+            )
+        self.report(
+            json.loads(process.stdout),
+            parse_importtime(lines),
+            options["target_settings"],
+            options["limit"],
+        )
+
+    def report(self, profile, imports, target_settings, limit):
+        phases = profile["phases"]
+        self.stdout.write(
+            f"Start-up with {target_settings}: "
+            f"{phases['total'] * 1000:.1f} ms, {len(imports)} modules "
+            "imported\n"
+        )
+
+        self.stdout.write(f"{'Phase':<32} {'ms':>8}")
+        rows = [(name, seconds) for name, seconds in phases.items()]
+        rows[-1:-1] = [
+            (f"warm-up: {step}", seconds)
+            for step, seconds in profile["warmup"].items()
+        ]
+        for name, seconds in rows:
+            self.stdout.write(f"{name:<32} {seconds * 1000:>8.1f}")
+
+        self.stdout.write(
+            f"\n{'App':<32} {'import':>8} {'models':>8} {'ready':>8}"
+        )
+        for label, times in profile["apps"].items():
+            self.stdout.write(
+                f"{label:<32} "
+                + " ".join(
+                    f"{times.get(phase, 0) * 1000:>8.1f}"
+                    for phase in ("import", "models", "ready")
+                )
+            )
+
+        packages = Counter()
+        for module, own, _, _ in imports:
+            packages[module.split(".")[0]] += own
+        self.stdout.write(f"\n{'Package (own import time)':<32} {'ms':>8}")
+        for package, seconds in packages.most_common(limit):
+            self.stdout.write(f"{package:<32} {seconds * 1000:>8.1f}")
+
+        self.stdout.write(
+            f"\n{'Module':<48} {'own ms':>8} {'total ms':>8}"
+        )
+        for module, own, cumulative, _ in sorted(
+            imports, key=lambda item: item[1], reverse=True
+        )[:limit]:
+            self.stdout.write(
+                f"{module:<48} {own * 1000:>8.1f} {cumulative * 1000:>8.1f}"
+            )
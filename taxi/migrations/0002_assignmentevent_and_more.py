@@ -0,0 +1,37 @@
+# Generated by Django 4.1 on 2026-10-19 07:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taxi', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssignmentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('assigned', 'Assigned'), ('unassigned', 'Unassigned')], max_length=10)),
+                ('occurred_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('car', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='assignment_events', to='taxi.car')),
+                ('driver', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='assignment_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['occurred_at', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='assignmentevent',
+            index=models.Index(fields=['car', 'occurred_at'], name='taxi_assign_car_id_4cc8fd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignmentevent',
+            index=models.Index(fields=['driver', 'occurred_at'], name='taxi_assign_driver__3af285_idx'),
+        ),
+    ]
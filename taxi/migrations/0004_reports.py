@@ -0,0 +1,60 @@
+# Generated by Django 4.1 on 2026-10-19 08:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taxi', '0003_car_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountryReport',
+            fields=[
+                ('country', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('manufacturer_count', models.PositiveIntegerField(default=0)),
+                ('car_count', models.PositiveIntegerField(default=0)),
+                ('driver_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['country'],
+            },
+        ),
+        migrations.CreateModel(
+            name='FleetReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('car_count', models.PositiveIntegerField(default=0)),
+                ('driver_count', models.PositiveIntegerField(default=0)),
+                ('unassigned_car_count', models.PositiveIntegerField(default=0)),
+                ('idle_driver_count', models.PositiveIntegerField(default=0)),
+                ('last_change_id', models.BigIntegerField(default=0)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ManufacturerReport',
+            fields=[
+                ('manufacturer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='taxi.manufacturer')),
+                ('name', models.CharField(max_length=255)),
+                ('country', models.CharField(max_length=255)),
+                ('car_count', models.PositiveIntegerField(default=0)),
+                ('driver_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReportChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('manufacturer_id', models.BigIntegerField(null=True)),
+                ('country', models.CharField(blank=True, max_length=255)),
+            ],
+        ),
+    ]
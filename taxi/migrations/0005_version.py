@@ -0,0 +1,23 @@
+# Generated by Django 4.1 on 2026-10-19 08:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taxi', '0004_reports'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='driver',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.1 on 2026-10-19 08:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taxi', '0005_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='manufacturerreport',
+            name='unassigned_car_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='reportchange',
+            name='driver_delta',
+            field=models.SmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='reportchange',
+            name='driver_id',
+            field=models.BigIntegerField(null=True),
+        ),
+    ]
@@ -1,6 +1,65 @@
 from django.db import models
+from django.db.models import Exists, F, OuterRef, Q
 from django.contrib.auth.models import AbstractUser
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+
+class VersionConflictError(Exception):
+    """Raised when saving a row that was changed since it was loaded. Like
+    any error inside ``save()`` it breaks the enclosing transaction, so
+    callers that recover from it save within their own ``atomic()``."""
+
+
+class VersionedModel(models.Model):
+    """Optimistic locking: every ``save()`` bumps ``version``, so that
+    forms opened before notice the change. After ``expect_version()`` the
+    next save only updates the row if its version is still the given one,
+    and raises ``VersionConflictError`` instead of overwriting the other
+    change. Other saves, like the admin's or a password change, are not
+    checked. Saves limited by ``update_fields`` that leave out ``version``
+    neither check nor bump it."""
+
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def expect_version(self, version):
+        self._expected_version = version
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields,
+                   forced_update):
+        if update_fields is not None and "version" not in update_fields:
+            return super()._do_update(
+                base_qs, using, pk_val, values, update_fields, forced_update
+            )
+        expected = self.__dict__.pop("_expected_version", None)
+        if expected is None:
+            values = [
+                (field, model,
+                 F("version") + 1 if field.name == "version" else value)
+                for field, model, value in values
+            ]
+            if base_qs.filter(pk=pk_val)._update(values):
+                # Loaded again when next read.
+                del self.__dict__["version"]
+                return True
+            return False
+        values = [
+            (field, model, expected + 1 if field.name == "version" else value)
+            for field, model, value in values
+        ]
+        if base_qs.filter(pk=pk_val, version=expected)._update(values):
+            self.version = expected + 1
+            return True
+        if base_qs.filter(pk=pk_val).exists():
+            raise VersionConflictError(
+                f"{self._meta.verbose_name} {pk_val} was changed since "
+                f"version {expected}."
+            )
+        return False
 
 
 class Manufacturer(models.Model):
@@ -13,8 +72,15 @@ class Manufacturer(models.Model):
     def __str__(self):
         return f"{self.name} {self.country}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets reporting see which country a manufacturer moved from.
+        instance._loaded_country = instance.__dict__.get("country")
+        return instance
 
-class Driver(AbstractUser):
+
+class Driver(VersionedModel, AbstractUser):
     license_number = models.CharField(max_length=255, unique=True)
 
     class Meta:
@@ -27,11 +93,177 @@ class Driver(AbstractUser):
     def get_absolute_url(self):
         return reverse("taxi:driver-detail", kwargs={"pk": self.pk})
 
+    @cached_property
+    def assigned_car_ids(self):
+        """Ids of the driver's cars; ``request.user`` comes with them
+        preloaded from ``taxi.auth.CachedModelBackend``."""
+        return frozenset(self.cars.values_list("id", flat=True))
+
 
-class Car(models.Model):
+class Car(VersionedModel):
     model = models.CharField(max_length=255)
     manufacturer = models.ForeignKey(Manufacturer, on_delete=models.CASCADE)
     drivers = models.ManyToManyField(Driver, related_name="cars")
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+    location_updated_at = models.DateTimeField(
+        null=True, blank=True, editable=False
+    )
 
     def __str__(self):
         return f"{self.model} ({self.manufacturer.name})"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets reporting see which manufacturer a car moved from.
+        instance._loaded_manufacturer_id = instance.__dict__.get(
+            "manufacturer_id"
+        )
+        return instance
+
+
+class AssignmentEventQuerySet(models.QuerySet):
+    def record(self, pairs, action, occurred_at=None):
+        """Append one event per ``(car_id, driver_id)`` pair."""
+        occurred_at = occurred_at or timezone.now()
+        return self.bulk_create(
+            self.model(
+                car_id=car_id,
+                driver_id=driver_id,
+                action=action,
+                occurred_at=occurred_at,
+            )
+            for car_id, driver_id in pairs
+        )
+
+    def superseding(self, **filters):
+        """Events of the same car/driver pair as the outer event that come
+        after it, ordered by ``occurred_at`` and then id. ``occurred_at``
+        may be set explicitly, so it need not follow the ids."""
+        return self.model.objects.filter(
+            Q(occurred_at__gt=OuterRef("occurred_at"))
+            | Q(occurred_at=OuterRef("occurred_at"), id__gt=OuterRef("id")),
+            car_id=OuterRef("car_id"),
+            driver_id=OuterRef("driver_id"),
+            **filters,
+        )
+
+    def assigned_as_of(self, moment):
+        """Events that are still in effect at ``moment``: the latest event
+        of each car/driver pair, when that event is an assignment.
+
+        Filter by car or driver first to use the composite indexes.
+        """
+        return self.filter(
+            occurred_at__lte=moment, action=AssignmentEvent.ASSIGNED
+        ).exclude(Exists(self.superseding(occurred_at__lte=moment)))
+
+    def drivers_of(self, car, moment):
+        return Driver.objects.filter(
+            id__in=self.filter(car=car)
+            .assigned_as_of(moment)
+            .values("driver_id")
+        )
+
+    def cars_of(self, driver, moment):
+        return Car.objects.filter(
+            id__in=self.filter(driver=driver)
+            .assigned_as_of(moment)
+            .values("car_id")
+        )
+
+
+class AssignmentEvent(models.Model):
+    """Append-only log of drivers being assigned to and removed from cars.
+
+    Rows outlive the car or driver they reference, hence no FK constraint.
+    """
+
+    ASSIGNED = "assigned"
+    UNASSIGNED = "unassigned"
+    ACTION_CHOICES = [
+        (ASSIGNED, "Assigned"),
+        (UNASSIGNED, "Unassigned"),
+    ]
+
+    car = models.ForeignKey(
+        Car,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="assignment_events",
+    )
+    driver = models.ForeignKey(
+        Driver,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="assignment_events",
+    )
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    occurred_at = models.DateTimeField(default=timezone.now)
+
+    objects = AssignmentEventQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["occurred_at", "id"]
+        indexes = [
+            models.Index(fields=["car", "occurred_at"]),
+            models.Index(fields=["driver", "occurred_at"]),
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.get_action_display()} driver {self.driver_id} "
+            f"to car {self.car_id} at {self.occurred_at}"
+        )
+
+
+class ReportChange(models.Model):
+    """Manufacturers and countries whose report rows are out of date, and
+    drivers created (``driver_delta`` 1) or deleted (-1).
+
+    Written when cars, manufacturers or drivers change; assignment changes
+    are read from ``AssignmentEvent`` instead. ``refresh_reports`` consumes
+    and deletes the rows.
+    """
+
+    manufacturer_id = models.BigIntegerField(null=True)
+    country = models.CharField(max_length=255, blank=True)
+    driver_id = models.BigIntegerField(null=True)
+    driver_delta = models.SmallIntegerField(default=0)
+
+
+class ManufacturerReport(models.Model):
+    manufacturer = models.OneToOneField(
+        Manufacturer, on_delete=models.CASCADE, primary_key=True
+    )
+    name = models.CharField(max_length=255)
+    country = models.CharField(max_length=255)
+    car_count = models.PositiveIntegerField(default=0)
+    unassigned_car_count = models.PositiveIntegerField(default=0)
+    driver_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["name"]
+
+
+class CountryReport(models.Model):
+    country = models.CharField(max_length=255, primary_key=True)
+    manufacturer_count = models.PositiveIntegerField(default=0)
+    car_count = models.PositiveIntegerField(default=0)
+    driver_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["country"]
+
+
+class FleetReport(models.Model):
+    """Single row with fleet-wide totals and the refresh watermarks."""
+
+    car_count = models.PositiveIntegerField(default=0)
+    driver_count = models.PositiveIntegerField(default=0)
+    unassigned_car_count = models.PositiveIntegerField(default=0)
+    idle_driver_count = models.PositiveIntegerField(default=0)
+    last_change_id = models.BigIntegerField(default=0)
+    last_event_id = models.BigIntegerField(default=0)
+    refreshed_at = models.DateTimeField(null=True)
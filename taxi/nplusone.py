@@ -0,0 +1,177 @@
+"""Detection of N+1 query patterns and per-view query budgets.
+
+Every query executed while a ``QueryRecorder`` is capturing is reduced to a
+fingerprint (its SQL with parameters and ``IN`` lists collapsed) together
+with the template line or project code line that triggered it. Fingerprints
+repeated with different parameters point at a loop issuing one query per
+row, which is what ``select_related``/``prefetch_related`` should replace.
+"""
+import logging
+import re
+import sys
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Node
+
+logger = logging.getLogger(__name__)
+
+IN_LIST_RE = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+WHITESPACE_RE = re.compile(r"\s+")
+IGNORED_PATHS = (
+    str(Path(__file__).resolve()),
+    str(Path(sys.prefix).resolve()),
+)
+
+
+class QueryInspectionError(AssertionError):
+    """Raised when a request issues N+1 queries or exceeds its budget."""
+
+
+def fingerprint(sql):
+    sql = IN_LIST_RE.sub("(%s+)", sql)
+    return WHITESPACE_RE.sub(" ", sql).strip()
+
+
+def _relative(path):
+    try:
+        return str(Path(path).resolve().relative_to(settings.BASE_DIR))
+    except ValueError:
+        return str(path)
+
+
+def caller_site():
+    """Return ``path:line`` of the template node or project code
+    responsible for the query currently being executed."""
+    frame = sys._getframe(2)
+    code_site = None
+    while frame is not None:
+        # type() rather than isinstance(): the latter would evaluate lazy
+        # objects such as request.user and recurse into more queries.
+        node = frame.f_locals.get("self")
+        if issubclass(type(node), Node) and getattr(node, "origin", None):
+            return f"{_relative(node.origin.name)}:{node.token.lineno}"
+        filename = frame.f_code.co_filename
+        if (
+            code_site is None
+            and filename.startswith(str(settings.BASE_DIR))
+            and not filename.startswith(IGNORED_PATHS)
+        ):
+            code_site = f"{_relative(filename)}:{frame.f_lineno}"
+        frame = frame.f_back
+    return code_site or "<unknown>"
+
+
+@dataclass
+class RepeatedQuery:
+    sql: str
+    count: int
+    sites: list = field(default_factory=list)
+
+    def __str__(self):
+        return (
+            f"{self.count} similar queries from {', '.join(self.sites)}: "
+            f"{self.sql}"
+        )
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((fingerprint(sql), repr(params), caller_site()))
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    @contextmanager
+    def capture(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    def repeated(self, threshold):
+        """Fingerprints executed at least ``threshold`` times with more
+        than one distinct parameter set."""
+        groups = defaultdict(list)
+        for sql, params, site in self.queries:
+            groups[sql].append((params, site))
+
+        repeated = []
+        for sql, executions in groups.items():
+            if (
+                len(executions) >= threshold
+                and len({params for params, _ in executions}) > 1
+            ):
+                sites = sorted({site for _, site in executions})
+                repeated.append(RepeatedQuery(sql, len(executions), sites))
+        return repeated
+
+
+@contextmanager
+def detect_n_plus_one(threshold=None, budget=None):
+    """Fail the enclosed block on N+1 queries or more than ``budget``
+    queries in total."""
+    recorder = QueryRecorder()
+    with recorder.capture():
+        yield recorder
+    problems = inspect_queries(
+        recorder, threshold or settings.QUERY_INSPECTION_THRESHOLD, budget
+    )
+    if problems:
+        raise QueryInspectionError("\n".join(problems))
+
+
+def inspect_queries(recorder, threshold, budget=None):
+    problems = [str(query) for query in recorder.repeated(threshold)]
+    if budget is not None and len(recorder) > budget:
+        problems.append(
+            f"{len(recorder)} queries executed, budget is {budget}"
+        )
+    return problems
+
+
+class QueryInspectionMiddleware:
+    """Report N+1 queries and query budget overruns per request.
+
+    Enabled by ``QUERY_INSPECTION_ENABLED``; budgets are looked up by view
+    name in ``QUERY_BUDGETS``. With ``QUERY_INSPECTION_RAISE`` problems
+    raise ``QueryInspectionError`` instead of being logged, which is how
+    the test runner turns them into failures.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSPECTION_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with recorder.capture():
+            response = self.get_response(request)
+
+        view_name = (
+            request.resolver_match.view_name
+            if request.resolver_match
+            else None
+        )
+        problems = inspect_queries(
+            recorder,
+            settings.QUERY_INSPECTION_THRESHOLD,
+            settings.QUERY_BUDGETS.get(view_name),
+        )
+        if problems:
+            message = f"{request.method} {request.path} ({view_name}):\n"
+            message += "\n".join(problems)
+            if settings.QUERY_INSPECTION_RAISE:
+                raise QueryInspectionError(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,121 @@
+"""Sliding-window rate limiting for individual URLs.
+
+Limits are declared next to the routes in ``taxi/urls.py`` by wrapping the
+view with ``ratelimit``. Each limited URL name gets one bucket per client
+IP and one per logged-in user. Bucket state lives in the
+``RATE_LIMIT_CACHE`` cache and is only written with ``add``/``incr``/
+``decr``, which are atomic in every Django cache backend, so workers sharing
+a memcached or Redis cache share their limits. Exhausted buckets answer
+429 with a ``Retry-After`` header.
+
+A bucket counts requests per fixed window of the rate's period, one key
+per window. The requests seen in the last period are estimated as the
+current window's count plus the previous window's count weighted by how
+much of the previous window still lies within the last period. Unlike
+plain fixed windows this does not let twice the rate through around a
+window boundary. A check costs two cache calls, ``incr`` and ``get``; the
+first request of a window adds the key and a refused one takes its count
+back. Keys expire once the next window is over.
+"""
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """``"30/m"`` -> ``(30, 60)``: requests allowed per period and the
+    period in seconds."""
+    count, period = rate.split("/")
+    return int(count), PERIODS[period[0]]
+
+
+def window_key(key, window):
+    return f"{key}:{window}"
+
+
+def consume(cache, key, limit, period, now=None):
+    """Count one request in the bucket at ``key``; return 0 when allowed,
+    otherwise the seconds until a request would be."""
+    now = time.time() if now is None else now
+    window = int(now // period)
+    current_key = window_key(key, window)
+    try:
+        current = cache.incr(current_key)
+    except ValueError:
+        cache.add(current_key, 0, 2 * period + 1)
+        current = cache.incr(current_key)
+    previous = cache.get(window_key(key, window - 1), 0)
+
+    # Share of the previous window still within the last period.
+    overlap = 1 - (now - window * period) / period
+    if previous * overlap + current <= limit:
+        return 0
+    cache.decr(current_key)
+    counted = current - 1
+    if counted < limit:
+        # Wait for enough of the previous window to slide out.
+        return (overlap - (limit - counted - 1) / previous) * period
+    # Wait for the next window, then for this one to slide out enough.
+    return overlap * period + max(0, 1 - (limit - 1) / counted) * period
+
+
+def client_ip(request):
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def check_rate(request, name, rate):
+    """Return the seconds to wait before ``request`` may hit the URL
+    ``name`` again, or 0."""
+    limit, period = parse_rate(rate)
+    cache = caches[settings.RATE_LIMIT_CACHE]
+    return max(
+        consume(cache, key, limit, period)
+        for key in request_buckets(request, name)
+    )
+
+
+def request_buckets(request, name):
+    """The buckets ``request`` takes from for the URL ``name``: one for
+    the client IP and one for the user when logged in."""
+    keys = [f"rl:{name}:ip:{client_ip(request)}"]
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        keys.append(f"rl:{name}:user:{user.pk}")
+    return keys
+
+
+def searching(request):
+    return bool(request.GET.get("search"))
+
+
+def ratelimit(view, rate, methods=None, when=None):
+    """Limit ``view`` to ``rate`` (``"<count>/<s|m|h|d>"``) requests per
+    client IP and per user.
+
+    ``methods`` restricts limiting to some HTTP methods and ``when`` to
+    requests it returns true for, e.g. ``searching``.
+    """
+
+    @wraps(view)
+    def wrapped_view(request, *args, **kwargs):
+        if (
+            settings.RATE_LIMIT_ENABLED
+            and (methods is None or request.method in methods)
+            and (when is None or when(request))
+        ):
+            retry_after = check_rate(
+                request, request.resolver_match.url_name, rate
+            )
+            if retry_after:
+                response = HttpResponse("Too many requests.", status=429)
+                response["Retry-After"] = str(math.ceil(retry_after))
+                return response
+        return view(request, *args, **kwargs)
+
+    return wrapped_view
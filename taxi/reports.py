@@ -0,0 +1,213 @@
+"""Incremental refresh of the fleet reporting tables.
+
+``ManufacturerReport``, ``CountryReport`` and ``FleetReport`` act as
+materialized views over cars, manufacturers and assignments. A refresh
+only recomputes the manufacturers and countries named in ``ReportChange``
+rows or touched by ``AssignmentEvent`` rows written since the previous
+refresh; both are tracked with id watermarks stored on ``FleetReport``.
+
+Fleet-wide car totals are summed from ``ManufacturerReport``. Driver totals
+are adjusted by the drivers created, deleted or (un)assigned since the
+previous refresh: a driver's car count at that time is their current count
+minus the assignments logged since. Only ``full=True`` counts the live
+tables, so compacting assignment events newer than the last refresh makes
+the driver totals drift until then.
+"""
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+
+from taxi.models import (
+    AssignmentEvent,
+    Car,
+    CountryReport,
+    Driver,
+    FleetReport,
+    Manufacturer,
+    ManufacturerReport,
+    ReportChange,
+)
+
+
+def log_changes(manufacturer_ids=(), countries=(), created_drivers=(),
+                deleted_drivers=()):
+    ReportChange.objects.bulk_create(
+        [ReportChange(manufacturer_id=pk) for pk in set(manufacturer_ids)]
+        + [ReportChange(country=country) for country in set(countries)]
+        + [
+            ReportChange(driver_id=pk, driver_delta=1)
+            for pk in set(created_drivers)
+        ]
+        + [
+            ReportChange(driver_id=pk, driver_delta=-1)
+            for pk in set(deleted_drivers)
+        ]
+    )
+
+
+def _upsert(model, rows, key):
+    model.objects.bulk_create(
+        [model(**row) for row in rows],
+        update_conflicts=True,
+        unique_fields=[key],
+        update_fields=[field for field in rows[0] if field != key],
+    )
+
+
+def refresh_manufacturers(manufacturer_ids):
+    rows = list(
+        Manufacturer.objects.filter(id__in=manufacturer_ids)
+        .annotate(
+            car_count=Count("car", distinct=True),
+            unassigned_car_count=Count(
+                "car", filter=Q(car__drivers__isnull=True), distinct=True
+            ),
+            driver_count=Count("car__drivers", distinct=True),
+        )
+        .values(
+            "id", "name", "country", "car_count", "unassigned_car_count",
+            "driver_count",
+        )
+        .order_by()
+    )
+    for row in rows:
+        row["manufacturer_id"] = row.pop("id")
+    if rows:
+        _upsert(ManufacturerReport, rows, "manufacturer_id")
+    return len(rows)
+
+
+def refresh_countries(countries):
+    rows = list(
+        Manufacturer.objects.filter(country__in=countries)
+        .values("country")
+        .annotate(
+            manufacturer_count=Count("id", distinct=True),
+            car_count=Count("car", distinct=True),
+            driver_count=Count("car__drivers", distinct=True),
+        )
+        .order_by()
+    )
+    CountryReport.objects.filter(country__in=countries).exclude(
+        country__in=[row["country"] for row in rows]
+    ).delete()
+    if rows:
+        _upsert(CountryReport, rows, "country")
+    return len(rows)
+
+
+def count_fleet(fleet):
+    fleet.car_count = Car.objects.count()
+    fleet.driver_count = Driver.objects.count()
+    fleet.unassigned_car_count = Car.objects.filter(
+        drivers__isnull=True
+    ).count()
+    fleet.idle_driver_count = Driver.objects.filter(
+        cars__isnull=True
+    ).count()
+
+
+def update_fleet(fleet, changes, events):
+    """Adjust the totals of ``fleet`` by the ``changes`` and assignment
+    ``events`` since its last refresh; the manufacturer rows must be
+    refreshed already."""
+    totals = ManufacturerReport.objects.aggregate(
+        cars=Sum("car_count"), unassigned=Sum("unassigned_car_count")
+    )
+    fleet.car_count = totals["cars"] or 0
+    fleet.unassigned_car_count = totals["unassigned"] or 0
+
+    driver_changes = list(
+        changes.filter(driver_id__isnull=False).values_list(
+            "driver_id", "driver_delta"
+        )
+    )
+    created = {pk for pk, delta in driver_changes if delta > 0}
+    assigned_since = dict(
+        events.values_list("driver_id")
+        .annotate(
+            net=Count("id", filter=Q(action=AssignmentEvent.ASSIGNED))
+            - Count("id", filter=Q(action=AssignmentEvent.UNASSIGNED))
+        )
+        .order_by()
+    )
+    touched = assigned_since.keys() | {pk for pk, _ in driver_changes}
+    car_counts = dict(
+        Driver.objects.filter(id__in=touched)
+        .annotate(Count("cars"))
+        .values_list("id", "cars__count")
+    )
+    idle_delta = 0
+    for pk in touched:
+        idle_now = car_counts.get(pk) == 0
+        idle_before = pk not in created and (
+            car_counts.get(pk, 0) - assigned_since.get(pk, 0) == 0
+        )
+        idle_delta += idle_now - idle_before
+    fleet.driver_count += sum(delta for _, delta in driver_changes)
+    fleet.idle_driver_count += idle_delta
+
+
+def refresh_reports(full=False):
+    """Bring the report tables up to date; return how many manufacturer
+    and country rows were recomputed."""
+    with transaction.atomic():
+        fleet, _ = FleetReport.objects.select_for_update().get_or_create(
+            pk=1
+        )
+        full = full or fleet.refreshed_at is None
+        last_change_id = (
+            ReportChange.objects.aggregate(Max("id"))["id__max"]
+            or fleet.last_change_id
+        )
+        last_event_id = (
+            AssignmentEvent.objects.aggregate(Max("id"))["id__max"]
+            or fleet.last_event_id
+        )
+
+        changes = ReportChange.objects.filter(
+            id__gt=fleet.last_change_id, id__lte=last_change_id
+        )
+        events = AssignmentEvent.objects.filter(
+            id__gt=fleet.last_event_id, id__lte=last_event_id
+        )
+        if full:
+            manufacturer_ids = set(
+                Manufacturer.objects.values_list("id", flat=True)
+            )
+            countries = set(CountryReport.objects.values_list(
+                "country", flat=True
+            ))
+        else:
+            manufacturer_ids = set(
+                changes.filter(manufacturer_id__isnull=False).values_list(
+                    "manufacturer_id", flat=True
+                )
+            )
+            countries = set(
+                changes.exclude(country="").values_list("country", flat=True)
+            )
+            manufacturer_ids.update(
+                Car.objects.filter(id__in=events.values("car_id")).values_list(
+                    "manufacturer_id", flat=True
+                )
+            )
+        countries.update(
+            Manufacturer.objects.filter(id__in=manufacturer_ids).values_list(
+                "country", flat=True
+            )
+        )
+
+        manufacturer_rows = refresh_manufacturers(manufacturer_ids)
+        country_rows = refresh_countries(countries)
+
+        if full:
+            count_fleet(fleet)
+        else:
+            update_fleet(fleet, changes, events)
+        fleet.last_change_id = last_change_id
+        fleet.last_event_id = last_event_id
+        fleet.refreshed_at = timezone.now()
+        fleet.save()
+        ReportChange.objects.filter(id__lte=last_change_id).delete()
+    return manufacturer_rows, country_rows
@@ -0,0 +1,208 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from taxi import auth, events, reports
+from taxi.models import AssignmentEvent, Car, Driver, Manufacturer
+from taxi.spatial import car_index
+
+CarDrivers = Car.drivers.through
+
+_bulk_delete = ContextVar("bulk_delete", default=False)
+
+
+@contextmanager
+def bulk_delete():
+    """Skip the per-row assignment logging of deletes; the caller logs the
+    assignments of all deleted rows with one query instead."""
+    token = _bulk_delete.set(True)
+    try:
+        yield
+    finally:
+        _bulk_delete.reset(token)
+
+
+def _pairs(instance, pk_set, reverse):
+    if reverse:
+        return [(car_id, instance.pk) for car_id in pk_set]
+    return [(instance.pk, driver_id) for driver_id in pk_set]
+
+
+def _current_pairs(instance, reverse):
+    lookup = {"driver_id": instance.pk} if reverse else {"car_id": instance.pk}
+    return list(
+        CarDrivers.objects.filter(**lookup).values_list("car_id", "driver_id")
+    )
+
+
+def assignments_changed(pairs, action):
+    """Log assignment changes in the current transaction and publish them
+    once it commits."""
+    if not pairs:
+        return
+    AssignmentEvent.objects.record(pairs, action)
+    auth.forget_users(driver_id for _, driver_id in pairs)
+    transaction.on_commit(lambda: events.publish_assignments(pairs, action))
+
+
+@receiver(m2m_changed, sender=CarDrivers)
+def record_assignment_change(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    """Log every change of ``Car.drivers``.
+
+    Related managers send ``m2m_changed`` inside their own atomic block, so
+    the events are committed or rolled back together with the change.
+    """
+    if action == "post_add" and pk_set:
+        assignments_changed(
+            _pairs(instance, pk_set, reverse), AssignmentEvent.ASSIGNED
+        )
+    elif action == "post_remove" and pk_set:
+        assignments_changed(
+            _pairs(instance, pk_set, reverse), AssignmentEvent.UNASSIGNED
+        )
+    elif action == "pre_clear":
+        instance._cleared_pairs = _current_pairs(instance, reverse)
+    elif action == "post_clear":
+        assignments_changed(
+            instance.__dict__.pop("_cleared_pairs", []),
+            AssignmentEvent.UNASSIGNED,
+        )
+
+
+@receiver(pre_delete, sender=Car)
+@receiver(pre_delete, sender=Driver)
+def record_unassign_on_delete(sender, instance, **kwargs):
+    """Deleting a car or driver drops its assignments without sending
+    ``m2m_changed``; log them as unassigned in the delete transaction."""
+    if _bulk_delete.get():
+        return
+    assignments_changed(
+        _current_pairs(instance, reverse=sender is Driver),
+        AssignmentEvent.UNASSIGNED,
+    )
+
+
+@receiver(post_save, sender=Car)
+def publish_car_saved(sender, instance, created, **kwargs):
+    action = "created" if created else "updated"
+    transaction.on_commit(lambda: events.publish_car(instance, action))
+
+
+@receiver(post_delete, sender=Car)
+def publish_car_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: events.publish_car(instance, "deleted"))
+
+
+@receiver(post_save, sender=Driver)
+def publish_driver_saved(sender, instance, created, update_fields,
+                         **kwargs):
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    action = "created" if created else "updated"
+    transaction.on_commit(lambda: events.publish_driver(instance, action))
+
+
+@receiver(post_delete, sender=Driver)
+def publish_driver_deleted(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: events.publish_driver(instance, "deleted")
+    )
+
+
+@receiver(m2m_changed, sender=CarDrivers)
+def update_car_index_assignments(sender, instance, action, reverse, pk_set,
+                                 **kwargs):
+    if car_index.built_at is None or action not in (
+        "post_add", "post_remove", "post_clear"
+    ):
+        return
+    if not reverse:
+        car_ids = [instance.pk]
+    elif pk_set:
+        car_ids = list(pk_set)
+    else:
+        car_index.invalidate()
+        return
+    transaction.on_commit(lambda: car_index.refresh_driver_counts(car_ids))
+
+
+@receiver(post_save, sender=Car)
+def update_car_index_location(sender, instance, **kwargs):
+    if car_index.built_at is None:
+        return
+    if instance.latitude is None or instance.longitude is None:
+        transaction.on_commit(lambda: car_index.remove(instance.pk))
+    else:
+        transaction.on_commit(
+            lambda: car_index.put_many([(
+                instance.pk,
+                instance.latitude,
+                instance.longitude,
+                instance.manufacturer_id,
+            )])
+        )
+
+
+@receiver(post_delete, sender=Car)
+def remove_from_car_index(sender, instance, **kwargs):
+    if car_index.built_at is not None:
+        transaction.on_commit(lambda: car_index.remove(instance.pk))
+
+
+@receiver(post_save, sender=Car)
+def log_car_report_change(sender, instance, created, **kwargs):
+    loaded = getattr(instance, "_loaded_manufacturer_id", None)
+    if created or loaded != instance.manufacturer_id:
+        reports.log_changes(
+            manufacturer_ids=[instance.manufacturer_id, loaded] if loaded
+            else [instance.manufacturer_id]
+        )
+    instance._loaded_manufacturer_id = instance.manufacturer_id
+
+
+@receiver(post_delete, sender=Car)
+def log_car_report_delete(sender, instance, **kwargs):
+    if not _bulk_delete.get():
+        reports.log_changes(manufacturer_ids=[instance.manufacturer_id])
+
+
+@receiver(post_save, sender=Manufacturer)
+def log_manufacturer_report_change(sender, instance, **kwargs):
+    loaded = getattr(instance, "_loaded_country", None)
+    reports.log_changes(
+        manufacturer_ids=[instance.pk],
+        countries=[loaded] if loaded and loaded != instance.country else [],
+    )
+    instance._loaded_country = instance.country
+
+
+@receiver(post_delete, sender=Manufacturer)
+def log_manufacturer_report_delete(sender, instance, **kwargs):
+    reports.log_changes(countries=[instance.country])
+
+
+@receiver(post_save, sender=Driver)
+def log_driver_report_create(sender, instance, created, **kwargs):
+    if created:
+        reports.log_changes(created_drivers=[instance.pk])
+
+
+@receiver(post_delete, sender=Driver)
+def log_driver_report_delete(sender, instance, **kwargs):
+    if not _bulk_delete.get():
+        reports.log_changes(deleted_drivers=[instance.pk])
+
+
+@receiver(post_save, sender=Driver)
+@receiver(post_delete, sender=Driver)
+def forget_cached_user(sender, instance, **kwargs):
+    auth.forget_users([instance.pk])
@@ -0,0 +1,261 @@
+"""In-memory grid index for nearest-car lookups.
+
+Cars with a known position are bucketed into square cells of
+``CAR_INDEX_CELL_SIZE`` degrees. A nearest-cars query scans rings of cells
+around the query point and stops once no unscanned ring can hold a closer
+car, so the cost depends on the local car density rather than the fleet
+size. Works on plain SQLite, no spatial extension needed.
+
+The index lives in the process; it is built from the database on first use,
+kept current by the ingestion view and model signals, and rebuilt after
+``CAR_INDEX_MAX_AGE`` seconds to pick up writes made by other workers.
+Longitude wrap-around at the antimeridian is not handled.
+"""
+import heapq
+import math
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db.models import Count
+
+from taxi.models import Car
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    half_chord = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(half_chord))
+
+
+@dataclass
+class IndexedCar:
+    latitude: float
+    longitude: float
+    manufacturer_id: int
+    driver_count: int
+    cell: tuple
+
+
+def driver_counts(car_ids):
+    """Number of drivers of each of ``car_ids``, with one grouped query."""
+    counts = dict.fromkeys(car_ids, 0)
+    counts.update(
+        Car.drivers.through.objects.filter(car_id__in=car_ids)
+        .values_list("car_id")
+        .annotate(Count("id"))
+        .order_by()
+    )
+    return counts
+
+
+class CarGrid:
+    def __init__(self, cell_size=0.01):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.cars = {}
+        self.bounds = None
+        self.built_at = None
+        self.lock = threading.RLock()
+        self.rebuild_lock = threading.Lock()
+
+    def cell_of(self, latitude, longitude):
+        return (
+            math.floor(latitude / self.cell_size),
+            math.floor(longitude / self.cell_size),
+        )
+
+    def __len__(self):
+        return len(self.cars)
+
+    def put(self, car_id, latitude, longitude, manufacturer_id,
+            driver_count=None):
+        with self.lock:
+            previous = self.cars.get(car_id)
+            if driver_count is None:
+                driver_count = previous.driver_count if previous else 0
+            cell = self.cell_of(latitude, longitude)
+            if previous and previous.cell != cell:
+                self._discard_from_cell(car_id, previous.cell)
+            self.cells.setdefault(cell, set()).add(car_id)
+            self.cars[car_id] = IndexedCar(
+                latitude, longitude, manufacturer_id, driver_count, cell
+            )
+            self._extend_bounds(cell)
+
+    def remove(self, car_id):
+        with self.lock:
+            previous = self.cars.pop(car_id, None)
+            if previous:
+                self._discard_from_cell(car_id, previous.cell)
+
+    def set_driver_counts(self, counts):
+        with self.lock:
+            for car_id, driver_count in counts.items():
+                if car_id in self.cars:
+                    self.cars[car_id].driver_count = driver_count
+
+    def put_many(self, positions):
+        """Place ``(car_id, latitude, longitude, manufacturer_id)``
+        positions, looking up the driver counts of cars new to the index
+        with one query; cars already indexed keep theirs."""
+        with self.lock:
+            new = [
+                car_id for car_id, *_ in positions if car_id not in self.cars
+            ]
+        counts = driver_counts(new) if new else {}
+        with self.lock:
+            for car_id, latitude, longitude, manufacturer_id in positions:
+                self.put(
+                    car_id, latitude, longitude, manufacturer_id,
+                    counts.get(car_id),
+                )
+
+    def refresh_driver_counts(self, car_ids):
+        if self.built_at is None:
+            return
+        self.set_driver_counts(driver_counts(car_ids))
+
+    def set_manufacturer(self, car_ids, manufacturer_id):
+        with self.lock:
+            for car_id in car_ids:
+                if car_id in self.cars:
+                    self.cars[car_id].manufacturer_id = manufacturer_id
+
+    def _discard_from_cell(self, car_id, cell):
+        members = self.cells.get(cell)
+        if members is not None:
+            members.discard(car_id)
+            if not members:
+                del self.cells[cell]
+
+    def _extend_bounds(self, cell):
+        if self.bounds is None:
+            self.bounds = (cell[0], cell[0], cell[1], cell[1])
+        else:
+            min_row, max_row, min_col, max_col = self.bounds
+            self.bounds = (
+                min(min_row, cell[0]),
+                max(max_row, cell[0]),
+                min(min_col, cell[1]),
+                max(max_col, cell[1]),
+            )
+
+    def _ring(self, center, radius):
+        row, col = center
+        if radius == 0:
+            yield center
+            return
+        for offset in range(-radius, radius + 1):
+            yield row - radius, col + offset
+            yield row + radius, col + offset
+        for offset in range(-radius + 1, radius):
+            yield row + offset, col - radius
+            yield row + offset, col + radius
+
+    def nearest(self, latitude, longitude, limit=5, manufacturer_id=None,
+                unassigned_only=True, max_distance_km=None):
+        """Return up to ``limit`` ``(car_id, distance_km)`` pairs, closest
+        first."""
+        with self.lock:
+            if not self.cars or limit <= 0:
+                return []
+            center = self.cell_of(latitude, longitude)
+            min_row, max_row, min_col, max_col = self.bounds
+            last_ring = max(
+                abs(center[0] - min_row),
+                abs(center[0] - max_row),
+                abs(center[1] - min_col),
+                abs(center[1] - max_col),
+            )
+            # Smallest distance covered by one ring of cells; longitude
+            # degrees shrink towards the poles.
+            ring_km = self.cell_size * KM_PER_DEGREE * max(
+                math.cos(math.radians(min(abs(latitude) + 1, 90))), 1e-3
+            )
+            best = []
+            for radius in range(last_ring + 1):
+                if len(best) == limit and (radius - 1) * ring_km > -best[0][0]:
+                    break
+                if (
+                    max_distance_km
+                    and (radius - 1) * ring_km > max_distance_km
+                ):
+                    break
+                for cell in self._ring(center, radius):
+                    for car_id in self.cells.get(cell, ()):
+                        car = self.cars[car_id]
+                        if unassigned_only and car.driver_count:
+                            continue
+                        if (
+                            manufacturer_id is not None
+                            and car.manufacturer_id != manufacturer_id
+                        ):
+                            continue
+                        distance = haversine_km(
+                            latitude, longitude, car.latitude, car.longitude
+                        )
+                        if max_distance_km and distance > max_distance_km:
+                            continue
+                        if len(best) < limit:
+                            heapq.heappush(best, (-distance, car_id))
+                        elif distance < -best[0][0]:
+                            heapq.heapreplace(best, (-distance, car_id))
+            return [
+                (car_id, -distance) for distance, car_id in sorted(best)[::-1]
+            ]
+
+    def rebuild(self):
+        """Reload every located car; queries keep using the previous state
+        until the new one is swapped in."""
+        fresh = CarGrid(self.cell_size)
+        cars = (
+            Car.objects.filter(latitude__isnull=False, longitude__isnull=False)
+            .annotate(driver_count=Count("drivers"))
+            .values_list(
+                "id", "latitude", "longitude", "manufacturer_id",
+                "driver_count",
+            )
+            .order_by()
+        )
+        for car in cars.iterator():
+            fresh.put(*car)
+        with self.lock:
+            self.cells = fresh.cells
+            self.cars = fresh.cars
+            self.bounds = fresh.bounds
+            self.built_at = time.monotonic()
+
+    def invalidate(self):
+        self.built_at = None
+
+    def is_stale(self):
+        return (
+            self.built_at is None
+            or time.monotonic() - self.built_at > settings.CAR_INDEX_MAX_AGE
+        )
+
+
+car_index = CarGrid(settings.CAR_INDEX_CELL_SIZE)
+
+
+def get_car_index():
+    """Return the shared index, rebuilding it when stale. Only the first
+    build blocks; later rebuilds happen in one thread while the others keep
+    answering from the previous state."""
+    if car_index.is_stale() and car_index.rebuild_lock.acquire(
+        blocking=car_index.built_at is None
+    ):
+        try:
+            if car_index.is_stale():
+                car_index.rebuild()
+        finally:
+            car_index.rebuild_lock.release()
+    return car_index
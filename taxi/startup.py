@@ -0,0 +1,152 @@
+"""Process start-up: warm-up before serving and start-up profiling.
+
+``warm_up`` runs the steps named in ``STARTUP_WARMUP`` when the WSGI/ASGI
+application is imported, so the first requests of a worker do not pay for
+them. Under a server that imports the application before forking its
+workers (``gunicorn --preload``), the workers inherit the warmed-up state.
+
+Run as ``python -X importtime -m taxi.startup`` this module sets Django up
+the way a worker does and prints the time spent per phase and per app as
+JSON (``--no-warmup`` skips the warm-up). ``manage.py startup_profile``
+does that in a subprocess and adds the import times reported by the
+interpreter. Nothing outside the standard library is imported at module
+level, so those imports are timed too.
+"""
+import json
+import logging
+import sys
+import time
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+
+def _warm_up_urls():
+    from django.urls import get_resolver, reverse
+
+    get_resolver().resolve("/")
+    reverse("taxi:index")
+
+
+def _warm_up_templates():
+    from taxi import templating
+
+    templating.warm_up()
+
+
+def _warm_up_database():
+    from django.db import connections
+
+    # Open every connection once so the driver and backend are initialised
+    # and a broken configuration shows up here; warm_up() closes them.
+    for connection in connections.all():
+        connection.ensure_connection()
+
+
+def _warm_up_car_index():
+    from taxi.spatial import get_car_index
+
+    get_car_index()
+
+
+WARMUP_STEPS = {
+    "urls": _warm_up_urls,
+    "templates": _warm_up_templates,
+    "database": _warm_up_database,
+    "car_index": _warm_up_car_index,
+}
+
+
+def warm_up(steps=None):
+    """Run ``steps`` (default: ``STARTUP_WARMUP``) in order; return the
+    seconds each took. Steps failing on the database, e.g. before it is
+    migrated, are logged and skipped. All connections are closed at the
+    end: forked workers must not share them."""
+    from django.conf import settings
+    from django.db import DatabaseError, connections
+
+    timings = {}
+    try:
+        for step in settings.STARTUP_WARMUP if steps is None else steps:
+            started = time.perf_counter()
+            try:
+                WARMUP_STEPS[step]()
+            except DatabaseError as error:
+                logger.warning("Skipped warm-up step %s: %s", step, error)
+                continue
+            timings[step] = time.perf_counter() - started
+    finally:
+        connections.close_all()
+    return timings
+
+
+def parse_importtime(lines):
+    """``(module, self seconds, cumulative seconds, depth)`` for every
+    ``-X importtime`` line in ``lines``; other lines are skipped."""
+    imports = []
+    for line in lines:
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        module = name.strip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append(
+            (module, int(own) / 1e6, int(cumulative) / 1e6, depth)
+        )
+    return imports
+
+
+def _time_app_configs(apps):
+    """Record import, models and ``ready()`` time of every app config the
+    registry creates from now on into ``apps``."""
+    from django.apps import config
+
+    create = config.AppConfig.create.__func__
+
+    def timed(label, phase, method):
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                apps[label][phase] = time.perf_counter() - started
+
+        return wrapper
+
+    def timed_create(cls, entry):
+        started = time.perf_counter()
+        app_config = create(cls, entry)
+        apps[app_config.label]["import"] = time.perf_counter() - started
+        for phase, name in (("models", "import_models"), ("ready", "ready")):
+            method = getattr(app_config, name)
+            setattr(app_config, name, timed(app_config.label, phase, method))
+        return app_config
+
+    config.AppConfig.create = classmethod(timed_create)
+
+
+def profile(warmup=True):
+    started = time.perf_counter()
+    import django
+
+    phases = {"import django": time.perf_counter() - started}
+    apps = defaultdict(dict)
+    _time_app_configs(apps)
+
+    mark = time.perf_counter()
+    django.setup(set_prefix=False)
+    phases["django.setup()"] = time.perf_counter() - mark
+
+    from django.core.handlers.wsgi import WSGIHandler
+
+    mark = time.perf_counter()
+    WSGIHandler()
+    phases["load middleware"] = time.perf_counter() - mark
+
+    warmup = warm_up() if warmup else {}
+    phases["total"] = time.perf_counter() - started
+    return {"phases": phases, "apps": apps, "warmup": warmup}
+
+
+if __name__ == "__main__":
+    print(json.dumps(profile(warmup="--no-warmup" not in sys.argv)))
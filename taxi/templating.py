@@ -0,0 +1,164 @@
+"""Template warm-up and per-template render timing.
+
+``warm_up`` parses every template the configured loaders can find, so the
+cached loader holds them before the first request instead of compiling
+them on demand. ``TemplateTimingMiddleware`` times how long each template
+takes to render during a request and logs it. Requests from
+``INTERNAL_IPS`` or staff users also get it in a ``Server-Timing`` header,
+which browsers show next to the request in their developer tools; other
+clients are not shown template names.
+Times are exclusive: a template's entry does not include the templates it
+extends or includes, those have entries of their own.
+"""
+import logging
+import os
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.template import (
+    Template,
+    TemplateDoesNotExist,
+    TemplateSyntaxError,
+    engines,
+)
+
+logger = logging.getLogger(__name__)
+
+_timings = ContextVar("template_timings", default=None)
+
+
+@dataclass
+class RenderTimings:
+    # Template name -> [renders, seconds].
+    templates: dict = field(default_factory=lambda: defaultdict(
+        lambda: [0, 0.0]
+    ))
+    # Time spent in nested templates, one entry per template being
+    # rendered.
+    nested: list = field(default_factory=list)
+
+    def add(self, name, seconds):
+        self.templates[name][0] += 1
+        self.templates[name][1] += seconds
+
+    def server_timing(self):
+        metrics = [
+            f"tpl-{number};dur={seconds * 1000:.2f};"
+            f'desc="{name} x{renders}"'
+            for number, (name, (renders, seconds)) in enumerate(
+                sorted(
+                    self.templates.items(),
+                    key=lambda item: item[1][1],
+                    reverse=True,
+                ),
+                start=1,
+            )
+        ]
+        total = sum(seconds for _, seconds in self.templates.values())
+        metrics.insert(0, f'tpl;dur={total * 1000:.2f};desc="templates"')
+        return ", ".join(metrics)
+
+
+def instrument():
+    """Make ``Template._render`` record into the current request's
+    ``RenderTimings``. Safe to call again, e.g. after the test runner
+    swapped ``_render`` for its own instrumentation."""
+    render = Template._render
+    if getattr(render, "timed", False):
+        return
+
+    @wraps(render)
+    def timed_render(template, context):
+        timings = _timings.get()
+        if timings is None:
+            return render(template, context)
+        timings.nested.append(0.0)
+        started = time.perf_counter()
+        try:
+            return render(template, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            nested = timings.nested.pop()
+            if timings.nested:
+                timings.nested[-1] += elapsed
+            timings.add(template.name or "<string>", elapsed - nested)
+
+    timed_render.timed = True
+    Template._render = timed_render
+
+
+class TemplateTimingMiddleware:
+    """Log render time per template, and add it as a ``Server-Timing``
+    header for internal IPs and staff.
+
+    Enabled by ``TEMPLATE_TIMING``.
+    """
+
+    def __init__(self, get_response):
+        if not settings.TEMPLATE_TIMING:
+            raise MiddlewareNotUsed
+        instrument()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RenderTimings()
+        token = _timings.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+        if not timings.templates:
+            return response
+        header = timings.server_timing()
+        logger.info("Template timings for %s: %s", request.path, header)
+        if self.shows_timings(request):
+            if response.has_header("Server-Timing"):
+                header = f"{response['Server-Timing']}, {header}"
+            response["Server-Timing"] = header
+        return response
+
+    @staticmethod
+    def shows_timings(request):
+        user = getattr(request, "user", None)
+        return request.META.get("REMOTE_ADDR") in settings.INTERNAL_IPS or (
+            user is not None and user.is_staff
+        )
+
+
+def template_names(engine):
+    names = set()
+    for loader in engine.template_loaders:
+        for directory in loader.get_dirs():
+            directory = str(directory)
+            for root, _, files in os.walk(directory):
+                for filename in files:
+                    path = os.path.relpath(
+                        os.path.join(root, filename), directory
+                    )
+                    names.add(path.replace(os.sep, "/"))
+    return sorted(names)
+
+
+def warm_up(alias="django"):
+    """Compile every template of the ``alias`` engine into its cached
+    loader; return how many were compiled and the seconds it took."""
+    engine = engines[alias].engine
+    started = time.perf_counter()
+    compiled = 0
+    for name in template_names(engine):
+        try:
+            engine.get_template(name)
+        except (
+            TemplateDoesNotExist, TemplateSyntaxError, UnicodeDecodeError
+        ) as error:
+            logger.debug("Skipped template %s: %s", name, error)
+        else:
+            compiled += 1
+    elapsed = time.perf_counter() - started
+    logger.info("Compiled %d templates in %.3fs", compiled, elapsed)
+    return compiled, elapsed
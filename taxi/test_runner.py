@@ -0,0 +1,161 @@
+import json
+import time
+import unittest
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test.runner import (
+    DiscoverRunner,
+    ParallelTestSuite,
+    RemoteTestResult,
+    RemoteTestRunner,
+)
+
+
+class IsolatedCachesMixin:
+    """Clear every cache before each test. Caches outlive the rolled back
+    test transaction, and SQLite hands out the same primary keys again, so
+    entries keyed by id (such as user snapshots) would leak into the next
+    test."""
+
+    def startTest(self, test):  # noqa: N802
+        for cache in caches.all():
+            cache.clear()
+        super().startTest(test)
+
+
+class TimingResultMixin:
+    """Accumulate wall time per test class.
+
+    Each test is charged the time since the previous test stopped, so class
+    level fixtures (``setUpClass``/``setUpTestData``) count towards the
+    first test of their class.
+    """
+
+    measure = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timings = defaultdict(lambda: [0, 0.0])
+        self._last_stop = time.perf_counter()
+
+    def stopTest(self, test):  # noqa: N802
+        super().stopTest(test)
+        if self.measure:
+            now = time.perf_counter()
+            self.add_timing(test, now - self._last_stop)
+            self._last_stop = now
+
+    def add_timing(self, test, seconds):
+        label = f"{type(test).__module__}.{type(test).__qualname__}"
+        self.timings[label][0] += 1
+        self.timings[label][1] += seconds
+
+
+class TimedTextTestResult(
+    IsolatedCachesMixin, TimingResultMixin, unittest.TextTestResult
+):
+    pass
+
+
+class TimedRemoteTestResult(
+    IsolatedCachesMixin, TimingResultMixin, RemoteTestResult
+):
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.pop("timings", None)
+        return state
+
+    def add_timing(self, test, seconds):
+        self.events.append(("add_timing", self.test_index, seconds))
+
+
+class TimedRemoteTestRunner(RemoteTestRunner):
+    resultclass = TimedRemoteTestResult
+
+
+class TimedParallelTestSuite(ParallelTestSuite):
+    runner_class = TimedRemoteTestRunner
+
+    def run(self, result):
+        # Timings come from the workers; events replayed in the parent
+        # process carry no meaningful wall time.
+        result.measure = False
+        return super().run(result)
+
+
+class TaxiTestRunner(DiscoverRunner):
+    """Test runner that fails requests issuing N+1 queries or going over
+    their ``QUERY_BUDGETS`` entry and reports time spent per test class."""
+
+    parallel_test_suite = TimedParallelTestSuite
+
+    def __init__(self, timing_report=None, timing_baseline=None, **kwargs):
+        super().__init__(**kwargs)
+        self.timing_report = timing_report
+        self.timing_baseline = timing_baseline
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--timing-report",
+            help="Write seconds spent per test class to this JSON file.",
+        )
+        parser.add_argument(
+            "--timing-baseline",
+            help="JSON file from an earlier --timing-report to compare "
+            "against.",
+        )
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_INSPECTION_ENABLED = True
+        settings.QUERY_INSPECTION_RAISE = True
+        # Every test client shares one IP; rate limit tests opt back in.
+        settings.RATE_LIMIT_ENABLED = False
+
+    def get_resultclass(self):
+        resultclass = super().get_resultclass()
+        if resultclass is None:
+            return TimedTextTestResult
+        return type(
+            resultclass.__name__, (IsolatedCachesMixin, resultclass), {}
+        )
+
+    def run_suite(self, suite, **kwargs):
+        result = super().run_suite(suite, **kwargs)
+        timings = getattr(result, "timings", None)
+        wanted = (
+            self.timing_report or self.timing_baseline or self.verbosity > 1
+        )
+        if timings and wanted:
+            self.report_timings(
+                {label: seconds for label, (_, seconds) in timings.items()},
+                {label: tests for label, (tests, _) in timings.items()},
+            )
+        return result
+
+    def report_timings(self, timings, counts):
+        baseline = {}
+        if self.timing_baseline:
+            with open(self.timing_baseline) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        width = max(len(label) for label in timings)
+        self.log(f"\n{'Test class':<{width}}  tests  seconds  speedup")
+        for label, seconds in sorted(
+            timings.items(), key=lambda item: item[1], reverse=True
+        ):
+            speedup = ""
+            if baseline.get(label) and seconds:
+                speedup = f"{baseline[label] / seconds:.1f}x"
+            self.log(
+                f"{label:<{width}}  {counts[label]:>5}  "
+                f"{seconds:>7.3f}  {speedup:>7}"
+            )
+
+        if self.timing_report:
+            with open(self.timing_report, "w") as report_file:
+                json.dump(timings, report_file, indent=2, sort_keys=True)
@@ -1,27 +1,84 @@
-from django.test import TestCase, Client
-from django.contrib.auth import get_user_model
+import asyncio
+import importlib
+import json
+import os
+import random
+import sys
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+from django.test import (
+    LiveServerTestCase,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.template import engines
 from django.urls import reverse
+from django.utils import timezone
 
-from taxi.models import Manufacturer, Car, Driver
+from taxi import auth, bulk, loadtest, startup, templating
+from taxi.admin import CarAdmin
+from taxi.auth import snapshot_key, user_cache
+from taxi.maintenance import BatchRunner
+from taxi.reports import refresh_reports
+from taxi.events import EventStreamApp, broker
+from taxi.factories import (
+    DEFAULT_PASSWORD,
+    create_car,
+    create_driver,
+    create_fleet,
+    create_manufacturer,
+)
+from taxi.models import (
+    AssignmentEvent,
+    Car,
+    CountryReport,
+    Driver,
+    FleetReport,
+    Manufacturer,
+    ManufacturerReport,
+    VersionConflictError,
+)
 from taxi.forms import DriverCreationForm, DriverLicenseUpdateForm, CarForm
+from taxi.ratelimit import consume
+from taxi.spatial import CarGrid, car_index, haversine_km
+from taxi.nplusone import (
+    QueryInspectionError,
+    detect_n_plus_one,
+    fingerprint,
+)
 
 
 class ModelTests(TestCase):
-    def setUp(self):
-        self.manufacturer = Manufacturer.objects.create(
+    @classmethod
+    def setUpTestData(cls):
+        cls.manufacturer = create_manufacturer(
             name="Test Manufacturer",
             country="Test Country"
         )
-        self.driver = get_user_model().objects.create_user(
+        cls.driver = create_driver(
             username="testdriver",
-            password="test12345",
             first_name="Test",
             last_name="Driver",
             license_number="ABC12345"
         )
-        self.car = Car.objects.create(
+        cls.car = create_car(
             model="Test Car",
-            manufacturer=self.manufacturer
+            manufacturer=cls.manufacturer
         )
 
     def test_manufacturer_str(self):
@@ -45,22 +102,21 @@ class ModelTests(TestCase):
 
 
 class ViewTests(TestCase):
-    def setUp(self):
-        self.client = Client()
-        self.driver = get_user_model().objects.create_user(
-            username="testdriver",
-            password="test12345"
-        )
-        self.client.force_login(self.driver)
-        self.manufacturer = Manufacturer.objects.create(
+    @classmethod
+    def setUpTestData(cls):
+        cls.driver = create_driver(username="testdriver")
+        cls.manufacturer = create_manufacturer(
             name="Test Manufacturer",
             country="Test Country"
         )
-        self.car = Car.objects.create(
+        cls.car = create_car(
             model="Test Car",
-            manufacturer=self.manufacturer
+            manufacturer=cls.manufacturer
         )
 
+    def setUp(self):
+        self.client.force_login(self.driver)
+
     def test_index_view(self):
         response = self.client.get(reverse("taxi:index"))
         self.assertEqual(response.status_code, 200)
@@ -138,6 +194,17 @@ class ViewTests(TestCase):
 
 
 class FormTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manufacturer = create_manufacturer(
+            name="Test Manufacturer",
+            country="Test Country"
+        )
+        cls.driver = create_driver(
+            username="testdriver",
+            license_number="XYZ98765"
+        )
+
     def setUp(self):
         self.driver_data = {
             "username": "newdriver",
@@ -147,15 +214,6 @@ class FormTests(TestCase):
             "last_name": "Driver",
             "license_number": "ABC12345"
         }
-        self.manufacturer = Manufacturer.objects.create(
-            name="Test Manufacturer",
-            country="Test Country"
-        )
-        self.driver = get_user_model().objects.create_user(
-            username="testdriver",
-            password="test12345",
-            license_number="XYZ98765"
-        )
 
     def test_driver_creation_form_valid(self):
         form = DriverCreationForm(data=self.driver_data)
@@ -165,13 +223,12 @@ class FormTests(TestCase):
         self.assertEqual(driver.license_number, "ABC12345")
 
     def test_driver_license_update_form_valid(self):
-        driver = get_user_model().objects.create_user(
+        driver = create_driver(
             username="license_update_driver",
-            password="test12345",
             license_number="ABC12345"
         )
         form = DriverLicenseUpdateForm(
-            data={"license_number": "NEW12345"},
+            data={"license_number": "NEW12345", "version": driver.version},
             instance=driver
         )
         self.assertTrue(form.is_valid())
@@ -191,25 +248,26 @@ class FormTests(TestCase):
 
 
 class SearchEdgeCasesTests(TestCase):
-    def setUp(self):
-        self.client = Client()
-        self.driver = get_user_model().objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        cls.driver = create_driver(
             username="testdriver",
-            password="test12345",
             first_name="John",
             last_name="Doe",
             license_number="ABC12345"
         )
-        self.client.force_login(self.driver)
-        self.manufacturer = Manufacturer.objects.create(
+        cls.manufacturer = create_manufacturer(
             name="Test Manufacturer",
             country="Test Country"
         )
-        self.car = Car.objects.create(
+        cls.car = create_car(
             model="Test Car",
-            manufacturer=self.manufacturer
+            manufacturer=cls.manufacturer
         )
 
+    def setUp(self):
+        self.client.force_login(self.driver)
+
     def test_empty_search_query(self):
         response = self.client.get(
             reverse("taxi:manufacturer-list"),
@@ -256,25 +314,26 @@ class SearchEdgeCasesTests(TestCase):
 
 
 class SearchTests(TestCase):
-    def setUp(self):
-        self.client = Client()
-        self.driver = get_user_model().objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        cls.driver = create_driver(
             username="testdriver",
-            password="test12345",
             first_name="John",
             last_name="Doe",
             license_number="ABC12345"
         )
-        self.client.force_login(self.driver)
-        self.manufacturer = Manufacturer.objects.create(
+        cls.manufacturer = create_manufacturer(
             name="Test Manufacturer",
             country="Test Country"
         )
-        self.car = Car.objects.create(
+        cls.car = create_car(
             model="Test Car",
-            manufacturer=self.manufacturer
+            manufacturer=cls.manufacturer
         )
 
+    def setUp(self):
+        self.client.force_login(self.driver)
+
     def test_manufacturer_search(self):
         response = self.client.get(
             reverse("taxi:manufacturer-list"),
@@ -347,3 +406,1212 @@ class SearchTests(TestCase):
         )
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "There are no drivers in the service.")
+
+
+class QueryInspectionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        fleet = create_fleet(
+            manufacturers=3, cars_per_manufacturer=1, drivers=1
+        )
+        cls.driver = fleet.drivers[0]
+
+    def setUp(self):
+        self.client.force_login(self.driver)
+
+    def test_fingerprint_collapses_in_lists(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s,\n %s)"),
+            fingerprint("SELECT * FROM t WHERE id IN (%s)"),
+        )
+
+    def test_n_plus_one_reports_template_line(self):
+        template = engines["django"].from_string(
+            "{% for car in cars %}\n{{ car.manufacturer.name }}{% endfor %}"
+        )
+        with self.assertRaisesMessage(QueryInspectionError, "3 similar"):
+            with detect_n_plus_one():
+                template.render({"cars": Car.objects.all()})
+
+    def test_select_related_passes(self):
+        with detect_n_plus_one(budget=1):
+            [str(car) for car in Car.objects.select_related("manufacturer")]
+
+    def test_views_within_budget(self):
+        car = Car.objects.first()
+        for url in (
+            reverse("taxi:car-list"),
+            reverse("taxi:car-detail", args=[car.pk]),
+            reverse("taxi:driver-detail", args=[self.driver.pk]),
+        ):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    @override_settings(QUERY_BUDGETS={"taxi:car-list": 1})
+    def test_view_over_budget_fails(self):
+        with self.assertRaisesMessage(QueryInspectionError, "budget is 1"):
+            self.client.get(reverse("taxi:car-list"))
+
+
+class FactoryTests(TestCase):
+    def test_create_fleet_uses_constant_queries(self):
+        with self.assertNumQueries(4):
+            fleet = create_fleet(
+                manufacturers=4, cars_per_manufacturer=5, drivers=10
+            )
+        self.assertEqual(len(fleet.cars), 20)
+        self.assertEqual(Car.drivers.through.objects.count(), 40)
+
+    def test_created_drivers_can_log_in(self):
+        driver = create_driver()
+        self.assertTrue(driver.check_password("test12345"))
+        self.assertTrue(
+            self.client.login(username=driver.username, password="test12345")
+        )
+        self.assertEqual(Driver.objects.get(pk=driver.pk), driver)
+
+
+class AssignmentHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.car = create_car()
+        cls.driver = create_driver()
+        cls.other_driver = create_driver()
+
+    def backdate(self, days):
+        AssignmentEvent.objects.filter(
+            occurred_at__gt=timezone.now() - timedelta(minutes=1)
+        ).update(occurred_at=timezone.now() - timedelta(days=days))
+
+    def test_toggle_records_events(self):
+        self.client.force_login(self.driver)
+        url = reverse("taxi:toggle-car-assign", args=[self.car.pk])
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(
+            list(
+                AssignmentEvent.objects.filter(car=self.car).values_list(
+                    "driver_id", "action"
+                )
+            ),
+            [
+                (self.driver.pk, AssignmentEvent.ASSIGNED),
+                (self.driver.pk, AssignmentEvent.UNASSIGNED),
+            ],
+        )
+
+    def test_form_set_and_delete_record_events(self):
+        form = CarForm(
+            instance=self.car,
+            data={
+                "model": self.car.model,
+                "manufacturer": self.car.manufacturer_id,
+                "drivers": [self.driver.pk, self.other_driver.pk],
+                "version": self.car.version,
+            },
+        )
+        form.is_valid()
+        form.save()
+        self.car.delete()
+        actions = AssignmentEvent.objects.values_list("action", flat=True)
+        self.assertEqual(
+            sorted(actions), ["assigned"] * 2 + ["unassigned"] * 2
+        )
+
+    def test_state_as_of(self):
+        self.car.drivers.add(self.driver)
+        self.backdate(10)
+        self.car.drivers.add(self.other_driver)
+        self.backdate(5)
+        self.car.drivers.remove(self.driver)
+
+        def drivers_at(days_ago):
+            moment = timezone.now() - timedelta(days=days_ago)
+            return set(AssignmentEvent.objects.drivers_of(self.car, moment))
+
+        self.assertEqual(drivers_at(20), set())
+        self.assertEqual(drivers_at(7), {self.driver})
+        self.assertEqual(drivers_at(3), {self.driver, self.other_driver})
+        self.assertEqual(drivers_at(0), {self.other_driver})
+        self.assertEqual(
+            set(
+                AssignmentEvent.objects.cars_of(
+                    self.driver, timezone.now() - timedelta(days=3)
+                )
+            ),
+            {self.car},
+        )
+
+    def test_compaction_keeps_state_after_cutoff(self):
+        self.car.drivers.add(self.driver, self.other_driver)
+        self.car.drivers.remove(self.other_driver)
+        self.backdate(10)
+        self.car.drivers.remove(self.driver)
+        self.backdate(5)
+        self.car.drivers.add(self.other_driver)
+
+        cutoff = timezone.now() - timedelta(days=7)
+        before = [
+            set(AssignmentEvent.objects.drivers_of(self.car, moment))
+            for moment in (cutoff, cutoff + timedelta(days=4), timezone.now())
+        ]
+        call_command(
+            "compact_assignment_history",
+            before=cutoff.isoformat(),
+            batch_size=1,
+            stdout=StringIO(),
+        )
+        after = [
+            set(AssignmentEvent.objects.drivers_of(self.car, moment))
+            for moment in (cutoff, cutoff + timedelta(days=4), timezone.now())
+        ]
+        self.assertEqual(before, after)
+        self.assertEqual(AssignmentEvent.objects.count(), 3)
+
+    def test_backfilled_events_are_ordered_by_time(self):
+        pair = [(self.car.pk, self.driver.pk)]
+        now = timezone.now()
+        AssignmentEvent.objects.record(
+            pair, AssignmentEvent.ASSIGNED, occurred_at=now - timedelta(days=2)
+        )
+        # Recorded later, but happened before the assignment.
+        AssignmentEvent.objects.record(
+            pair, AssignmentEvent.UNASSIGNED,
+            occurred_at=now - timedelta(days=3),
+        )
+        self.assertEqual(
+            set(AssignmentEvent.objects.drivers_of(self.car, now)),
+            {self.driver},
+        )
+        call_command(
+            "compact_assignment_history",
+            before=(now - timedelta(days=1)).isoformat(),
+            stdout=StringIO(),
+        )
+        self.assertEqual(
+            set(AssignmentEvent.objects.drivers_of(self.car, now)),
+            {self.driver},
+        )
+
+
+class CarGridTests(TestCase):
+    def test_nearest_matches_brute_force(self):
+        rng = random.Random(7)
+        grid = CarGrid(cell_size=0.01)
+        points = {}
+        for car_id in range(500):
+            point = (50.4 + rng.random() * 0.2, 30.4 + rng.random() * 0.3)
+            points[car_id] = point
+            grid.put(car_id, *point, manufacturer_id=car_id % 3,
+                     driver_count=car_id % 2)
+
+        origin = (50.5, 30.5)
+        expected = sorted(
+            (haversine_km(*origin, *point), car_id)
+            for car_id, point in points.items()
+            if car_id % 2 == 0 and car_id % 3 == 1
+        )[:5]
+        result = grid.nearest(*origin, limit=5, manufacturer_id=1)
+        self.assertEqual(
+            [car_id for car_id, _ in result],
+            [car_id for _, car_id in expected],
+        )
+
+    def test_nearest_without_limit(self):
+        grid = CarGrid()
+        grid.put(1, 50.0, 30.0, manufacturer_id=1)
+        self.assertEqual(grid.nearest(50.0, 30.0, limit=0), [])
+
+    def test_moving_and_removing_cars(self):
+        grid = CarGrid()
+        grid.put(1, 50.0, 30.0, manufacturer_id=1)
+        grid.put(1, 51.0, 31.0, manufacturer_id=1)
+        self.assertEqual(len(grid.cells), 1)
+        self.assertEqual(grid.nearest(51.0, 31.0)[0][0], 1)
+        grid.remove(1)
+        self.assertEqual(grid.nearest(51.0, 31.0), [])
+
+
+class CarLocationViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.driver = create_driver()
+        cls.near = create_car(model="Near")
+        cls.far = create_car(model="Far", manufacturer=cls.near.manufacturer)
+        cls.busy = create_car(model="Busy", drivers=[cls.driver])
+
+    def setUp(self):
+        car_index.invalidate()
+        self.client.force_login(self.driver)
+
+    def post_positions(self, positions):
+        return self.client.post(
+            reverse("taxi:car-positions"),
+            json.dumps({"positions": positions}),
+            content_type="application/json",
+        )
+
+    def test_ingest_ignores_stale_positions(self):
+        response = self.post_positions([
+            {"car": self.near.pk, "lat": 50.45, "lon": 30.52,
+             "timestamp": "2024-01-01T10:00:00+00:00"},
+            {"car": self.far.pk, "lat": 50.30, "lon": 30.90},
+        ])
+        self.assertEqual(response.json(), {"updated": 2, "ignored": 0})
+        response = self.post_positions([
+            {"car": self.near.pk, "lat": 0, "lon": 0,
+             "timestamp": "2023-01-01T10:00:00+00:00"},
+        ])
+        self.assertEqual(response.json(), {"updated": 0, "ignored": 1})
+        self.near.refresh_from_db()
+        self.assertEqual(self.near.latitude, 50.45)
+
+    def test_ingest_rejects_invalid_batch(self):
+        response = self.post_positions([{"car": self.near.pk, "lat": 91}])
+        self.assertEqual(response.status_code, 400)
+
+    def test_nearest_rejects_limit_below_one(self):
+        self.post_positions([
+            {"car": self.near.pk, "lat": 50.45, "lon": 30.52},
+        ])
+        for limit in (0, -1):
+            response = self.client.get(
+                reverse("taxi:car-nearest"),
+                {"lat": 50.45, "lon": 30.52, "limit": limit},
+            )
+            self.assertEqual(response.status_code, 400)
+
+    def test_nearest_skips_assigned_cars(self):
+        self.post_positions([
+            {"car": self.near.pk, "lat": 50.45, "lon": 30.52},
+            {"car": self.far.pk, "lat": 50.30, "lon": 30.90},
+            {"car": self.busy.pk, "lat": 50.45, "lon": 30.52},
+        ])
+        response = self.client.get(
+            reverse("taxi:car-nearest"), {"lat": 50.45, "lon": 30.52}
+        )
+        self.assertEqual(
+            [car["model"] for car in response.json()["cars"]],
+            ["Near", "Far"],
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.near.drivers.add(self.driver)
+        response = self.client.get(
+            reverse("taxi:car-nearest"),
+            {
+                "lat": 50.45,
+                "lon": 30.52,
+                "manufacturer": self.near.manufacturer_id,
+            },
+        )
+        self.assertEqual(
+            [car["model"] for car in response.json()["cars"]], ["Far"]
+        )
+
+    def test_cars_new_to_built_index_keep_their_drivers(self):
+        self.post_positions([
+            {"car": self.near.pk, "lat": 50.45, "lon": 30.52},
+        ])
+        self.assertIsNotNone(car_index.built_at)
+        self.post_positions([
+            {"car": self.busy.pk, "lat": 50.45, "lon": 30.52},
+        ])
+        response = self.client.get(
+            reverse("taxi:car-nearest"), {"lat": 50.45, "lon": 30.52}
+        )
+        self.assertEqual(
+            [car["model"] for car in response.json()["cars"]], ["Near"]
+        )
+
+
+class EventStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.driver = create_driver()
+        cls.car = create_car()
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.queue = asyncio.Queue()
+        broker.subscribers.add((self.loop, self.queue))
+
+    def tearDown(self):
+        broker.subscribers.clear()
+        self.loop.close()
+
+    def published(self):
+        self.loop.run_until_complete(asyncio.sleep(0))
+        events = []
+        while not self.queue.empty():
+            events.append(self.queue.get_nowait())
+        return events
+
+    def test_toggle_publishes_assignment_after_commit(self):
+        self.client.force_login(self.driver)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(
+                reverse("taxi:toggle-car-assign", args=[self.car.pk])
+            )
+        events = self.published()
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]["type"], "assignment")
+        self.assertEqual(events[0]["action"], "assigned")
+        self.assertEqual(events[0]["car"], self.car.pk)
+        self.assertEqual(
+            events[0]["driver"]["username"], self.driver.username
+        )
+
+    def test_rolled_back_changes_are_not_published(self):
+        self.car.model = "Renamed"
+        with self.captureOnCommitCallbacks(execute=False):
+            self.car.save()
+        self.assertEqual(self.published(), [])
+
+    def test_stream_requires_login(self):
+        async def request():
+            app = EventStreamApp(None)
+            communicator = ApplicationCommunicator(
+                app, {"type": "http", "path": "/events/", "headers": []}
+            )
+            await communicator.send_input({"type": "http.request"})
+            return await communicator.receive_output()
+
+        self.assertEqual(async_to_sync(request)()["status"], 403)
+
+    def test_stream_delivers_events_for_car(self):
+        self.client.force_login(self.driver)
+        cookie = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        car_id = self.car.pk
+
+        async def stream():
+            app = EventStreamApp(None)
+            communicator = ApplicationCommunicator(app, {
+                "type": "http",
+                "path": "/events/",
+                "query_string": f"car={car_id}".encode(),
+                "headers": [
+                    (b"cookie", f"sessionid={cookie}".encode()),
+                ],
+            })
+            await communicator.send_input({"type": "http.request"})
+            start = await communicator.receive_output()
+            await communicator.receive_output()
+            broker.publish({"type": "car", "action": "updated", "car": 0})
+            broker.publish(
+                {"type": "car", "action": "updated", "car": car_id}
+            )
+            body = await communicator.receive_output()
+            await communicator.send_input({"type": "http.disconnect"})
+            await communicator.wait()
+            return start, body["body"].decode()
+
+        start, body = async_to_sync(stream)()
+        self.assertEqual(start["status"], 200)
+        self.assertIn((b"content-type", b"text/event-stream"),
+                      start["headers"])
+        self.assertTrue(body.startswith("event: car\n"))
+        self.assertIn(f'"car": {car_id}', body)
+
+
+@override_settings(RATE_LIMIT_ENABLED=True)
+class RateLimitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.driver = create_driver()
+        cls.car = create_car()
+
+    def setUp(self):
+        self.cache = caches["ratelimit"]
+        self.cache.clear()
+        self.client.force_login(self.driver)
+
+    def test_window_slides(self):
+        def take(now):
+            return consume(self.cache, "bucket", 3, 10, now=now)
+
+        self.assertEqual([take(100) for _ in range(3)], [0, 0, 0])
+        # Until 2/3 of this window has slid out of the next one.
+        self.assertAlmostEqual(take(101), 12.33, places=2)
+        # Half of the previous window still counts: 1.5 + 1 allowed.
+        self.assertEqual(take(115), 0)
+        self.assertAlmostEqual(take(115), 1.67, places=2)
+        self.assertEqual(take(117), 0)
+        # A long idle period leaves nothing in either window.
+        self.assertEqual([take(1000) for _ in range(3)], [0, 0, 0])
+        self.assertGreater(take(1000), 0)
+
+    def test_toggle_returns_429_with_retry_after(self):
+        url = reverse("taxi:toggle-car-assign", args=[self.car.pk])
+        statuses = [self.client.get(url).status_code for _ in range(21)]
+        self.assertEqual(statuses[:20], [302] * 20)
+        self.assertEqual(statuses[20], 429)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+
+    def test_only_searches_are_limited(self):
+        url = reverse("taxi:car-list")
+        for _ in range(60):
+            self.client.get(url, {"search": "model"})
+        self.assertEqual(
+            self.client.get(url, {"search": "model"}).status_code, 429
+        )
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_benchmark_keeps_live_buckets(self):
+        consume(self.cache, "rl:car-list:ip:127.0.0.1", 3, 60, now=0)
+        out = StringIO()
+        call_command(
+            "benchmark_ratelimit", "--iterations=20", "--clients=5",
+            stdout=out,
+        )
+        self.assertIn("ratelimit (django.core.cache", out.getvalue())
+        self.assertEqual(self.cache.get("rl:car-list:ip:127.0.0.1:0"), 1)
+        self.assertEqual(len(self.cache._cache), 1)
+
+
+class BulkActionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fleet = create_fleet(
+            manufacturers=2, cars_per_manufacturer=5, drivers=4
+        )
+        cls.user = create_driver()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.car_ids = [car.id for car in self.fleet.cars]
+        self.driver_ids = [driver.id for driver in self.fleet.drivers]
+
+    def count_queries(self, operation, *args):
+        with CaptureQueriesContext(connection) as queries:
+            operation(*args)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_selection(self):
+        for operation, ids in (
+            (bulk.delete_cars, self.car_ids),
+            (bulk.delete_drivers, self.driver_ids),
+        ):
+            small = self.count_queries(operation, set(ids[:1]))
+            large = self.count_queries(operation, set(ids[1:]))
+            self.assertEqual(small, large)
+
+    def test_confirmation_shows_counts(self):
+        response = self.client.post(
+            reverse("taxi:car-bulk"),
+            {"ids": self.car_ids[:3], "action": "delete"},
+        )
+        self.assertContains(response, "3 cars selected")
+        self.assertContains(response, "6 driver assignments")
+        self.assertEqual(Car.objects.count(), 10)
+
+    def test_delete_cars_logs_unassignments(self):
+        response = self.client.post(
+            reverse("taxi:car-bulk"),
+            {"ids": self.car_ids[:3], "action": "delete", "confirm": "on"},
+        )
+        self.assertRedirects(response, reverse("taxi:car-list"))
+        self.assertEqual(Car.objects.count(), 7)
+        self.assertEqual(
+            AssignmentEvent.objects.filter(
+                action=AssignmentEvent.UNASSIGNED
+            ).count(),
+            6,
+        )
+
+    def test_change_manufacturer(self):
+        manufacturer = create_manufacturer()
+        self.client.post(
+            reverse("taxi:car-bulk"),
+            {
+                "ids": self.car_ids,
+                "action": "change_manufacturer",
+                "manufacturer": manufacturer.pk,
+                "confirm": "on",
+            },
+        )
+        self.assertEqual(manufacturer.car_set.count(), 10)
+
+    def test_assign_requires_drivers_on_confirm(self):
+        response = self.client.post(
+            reverse("taxi:car-bulk"),
+            {"ids": self.car_ids, "action": "assign", "confirm": "on"},
+        )
+        self.assertContains(response, "This field is required.")
+
+    def test_assign_and_unassign_from_driver_list(self):
+        car_ids = self.car_ids[:2]
+        self.client.post(
+            reverse("taxi:driver-bulk"),
+            {
+                "ids": [self.user.pk],
+                "action": "assign",
+                "cars": car_ids,
+                "confirm": "on",
+            },
+        )
+        self.assertEqual(
+            sorted(self.user.cars.values_list("id", flat=True)), car_ids
+        )
+        self.client.post(
+            reverse("taxi:driver-bulk"),
+            {
+                "ids": [self.user.pk],
+                "action": "unassign",
+                "cars": car_ids,
+                "confirm": "on",
+            },
+        )
+        self.assertFalse(self.user.cars.exists())
+        self.assertEqual(
+            list(
+                AssignmentEvent.objects.filter(driver=self.user)
+                .values_list("action", flat=True)
+            ),
+            ["assigned"] * 2 + ["unassigned"] * 2,
+        )
+
+    def test_deleted_rows_in_selection_are_skipped(self):
+        deleted = create_driver()
+        deleted_id = deleted.pk
+        deleted.delete()
+        response = self.client.post(
+            reverse("taxi:driver-bulk"),
+            {
+                "ids": [self.user.pk, deleted_id],
+                "action": "assign",
+                "cars": self.car_ids[:1],
+                "confirm": "on",
+            },
+        )
+        self.assertRedirects(response, reverse("taxi:driver-list"))
+        self.assertFalse(
+            Car.drivers.through.objects.filter(driver_id=deleted_id).exists()
+        )
+        self.assertFalse(
+            AssignmentEvent.objects.filter(driver_id=deleted_id).exists()
+        )
+        self.assertTrue(self.user.cars.filter(pk=self.car_ids[0]).exists())
+
+
+class ReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.germany = [
+            create_manufacturer(name=name, country="Germany")
+            for name in ("BMW", "Audi")
+        ]
+        cls.japan = create_manufacturer(name="Honda", country="Japan")
+        cls.driver = create_driver()
+        cls.car = create_car(manufacturer=cls.germany[0], drivers=[cls.driver])
+        create_car(manufacturer=cls.japan)
+        refresh_reports()
+
+    def report(self, manufacturer):
+        return ManufacturerReport.objects.get(manufacturer=manufacturer)
+
+    def test_full_refresh_builds_all_tables(self):
+        self.assertEqual(refresh_reports(full=True), (3, 2))
+        germany = CountryReport.objects.get(country="Germany")
+        self.assertEqual(
+            (germany.manufacturer_count, germany.car_count,
+             germany.driver_count),
+            (2, 1, 1),
+        )
+        fleet = FleetReport.objects.get()
+        self.assertEqual(
+            (fleet.car_count, fleet.unassigned_car_count,
+             fleet.driver_count, fleet.idle_driver_count),
+            (2, 1, 1, 0),
+        )
+
+    def test_refresh_without_changes_recomputes_nothing(self):
+        self.assertEqual(refresh_reports(), (0, 0))
+
+    def test_assignment_refreshes_only_affected_rows(self):
+        honda_car = Car.objects.get(manufacturer=self.japan)
+        honda_car.drivers.add(self.driver)
+        self.assertEqual(refresh_reports(), (1, 1))
+        self.assertEqual(self.report(self.japan).driver_count, 1)
+        self.assertEqual(FleetReport.objects.get().unassigned_car_count, 0)
+
+    def test_moving_a_car_refreshes_both_manufacturers(self):
+        self.car.manufacturer = self.japan
+        self.car.save()
+        self.assertEqual(refresh_reports(), (2, 2))
+        self.assertEqual(self.report(self.germany[0]).car_count, 0)
+        self.assertEqual(self.report(self.japan).car_count, 2)
+
+    def test_country_change_refreshes_old_and_new_country(self):
+        self.japan.country = "Germany"
+        self.japan.save()
+        self.assertEqual(refresh_reports(), (1, 1))
+        self.assertFalse(CountryReport.objects.filter(country="Japan"))
+        self.assertEqual(
+            CountryReport.objects.get(country="Germany").manufacturer_count, 3
+        )
+
+    def test_bulk_delete_is_reflected(self):
+        bulk.delete_cars([self.car.pk])
+        refresh_reports()
+        self.assertEqual(self.report(self.germany[0]).car_count, 0)
+        self.assertEqual(FleetReport.objects.get().idle_driver_count, 1)
+
+    def test_incremental_fleet_totals_match_full_count(self):
+        def totals():
+            fleet = FleetReport.objects.get()
+            return (fleet.car_count, fleet.unassigned_car_count,
+                    fleet.driver_count, fleet.idle_driver_count)
+
+        idle = create_driver()
+        create_driver().delete()
+        busy = create_driver()
+        self.car.drivers.add(busy)
+        create_car(manufacturer=self.germany[1], drivers=[idle])
+        bulk.delete_drivers([self.driver.pk])
+        refresh_reports()
+        incremental = totals()
+        refresh_reports(full=True)
+        self.assertEqual(incremental, totals())
+        self.assertEqual(incremental, (3, 1, 2, 0))
+
+    def test_refresh_does_not_count_live_tables(self):
+        self.car.drivers.clear()
+        with CaptureQueriesContext(connection) as queries:
+            refresh_reports()
+        for query in queries:
+            self.assertNotIn("COUNT(*)", query["sql"])
+
+    def test_command(self):
+        out = StringIO()
+        call_command("refresh_reports", "--full", stdout=out)
+        self.assertIn("3 manufacturer and 2 country rows", out.getvalue())
+
+    def test_view_reads_report_tables_only(self):
+        self.client.force_login(self.driver)
+        response = self.client.get(reverse("taxi:report"))
+        self.assertContains(response, "Honda")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("taxi:report"))
+        tables = {"taxi_car", "taxi_manufacturer", "taxi_car_drivers"}
+        for query in queries:
+            self.assertFalse(
+                tables & set(query["sql"].replace('"', " ").split()),
+                query["sql"],
+            )
+
+
+class LoadTestTests(LiveServerTestCase):
+    def setUp(self):
+        self.fleet = create_fleet(manufacturers=2, drivers=2)
+        self.target = loadtest.Target(self.server_thread.host,
+                                      self.server_thread.port)
+
+    def log_in(self):
+        return async_to_sync(loadtest.log_in)(
+            self.target, self.fleet.drivers[0].username, DEFAULT_PASSWORD
+        )
+
+    def test_log_in_returns_session(self):
+        self.assertIn(settings.SESSION_COOKIE_NAME, self.log_in())
+
+    def test_log_in_with_wrong_password_fails(self):
+        with self.assertRaises(RuntimeError):
+            async_to_sync(loadtest.log_in)(
+                self.target, self.fleet.drivers[0].username, "wrong"
+            )
+
+    def test_run_load_covers_the_mix_without_errors(self):
+        results, elapsed = async_to_sync(loadtest.run_load)(
+            self.target,
+            [self.log_in()],
+            loadtest.load_catalog(),
+            loadtest.DEFAULT_MIX,
+            1,
+            random.Random,
+        )
+        self.assertGreater(elapsed, 0)
+        for name, stats in results.items():
+            self.assertIn(name, loadtest.DEFAULT_MIX)
+            self.assertFalse(stats.errors, name)
+
+
+class LoadTestHelperTests(SimpleTestCase):
+    def test_parse_mix(self):
+        self.assertEqual(
+            loadtest.parse_mix("car-list=3,index"),
+            {"car-list": 3.0, "index": 1.0},
+        )
+        with self.assertRaises(ValueError):
+            loadtest.parse_mix("cars=1")
+
+    def test_latency_stats(self):
+        stats = loadtest.LatencyStats()
+        for milliseconds in (1, 7, 7, 30, 4000):
+            stats.add(milliseconds / 1000)
+        stats.add(0.02, "500")
+        self.assertEqual(stats.percentile(50), 0.007)
+        self.assertEqual(stats.percentile(100), 4)
+        self.assertEqual(stats.histogram(), [1, 2, 1, 1, 0, 0, 0, 0, 0, 1])
+        self.assertEqual(stats.errors, {"500": 1})
+
+    def test_bad_responses_are_counted(self):
+        async def hang_up(reader, writer):
+            writer.close()
+
+        async def run():
+            server = await asyncio.start_server(hang_up, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                return await loadtest.run_load(
+                    loadtest.Target("127.0.0.1", port),
+                    [{}],
+                    loadtest.Catalog([1], [1], ["a"], ["a"], ["a"]),
+                    {"index": 1},
+                    0.2,
+                    random.Random,
+                )
+
+        results, _ = asyncio.run(run())
+        self.assertGreater(results["index"].errors["bad-response"], 0)
+
+
+class CachedUserTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.driver = create_driver()
+        cls.car = create_car(drivers=[cls.driver])
+        cls.other_car = create_car()
+
+    def setUp(self):
+        self.client.force_login(self.driver)
+
+    def test_warm_request_reads_no_user_rows(self):
+        self.client.get(reverse("taxi:manufacturer-list"))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("taxi:manufacturer-list"))
+        self.assertFalse(
+            [query for query in queries if "taxi_driver" in query["sql"]]
+        )
+
+    def test_snapshot_holds_assigned_car_ids(self):
+        self.client.get(reverse("taxi:index"))
+        _, car_ids = user_cache().get(snapshot_key(self.driver.pk))
+        self.assertEqual(car_ids, {self.car.pk})
+        self.assertEqual(
+            Driver.objects.get(pk=self.driver.pk).assigned_car_ids,
+            {self.car.pk},
+        )
+
+    def test_toggle_updates_snapshot(self):
+        url = reverse("taxi:car-detail", args=[self.other_car.pk])
+        self.assertContains(self.client.get(url), "Assign me")
+        self.client.get(
+            reverse("taxi:toggle-car-assign", args=[self.other_car.pk])
+        )
+        self.assertContains(self.client.get(url), "Delete me")
+        self.client.get(
+            reverse("taxi:toggle-car-assign", args=[self.other_car.pk])
+        )
+        self.assertContains(self.client.get(url), "Assign me")
+
+    def test_snapshot_key_depends_on_fields(self):
+        self.client.get(reverse("taxi:index"))
+        key = snapshot_key(self.driver.pk)
+        self.assertIsNotNone(user_cache().get(key))
+        with mock.patch(
+            "taxi.auth._fields", lambda: ["id", "username", "password"]
+        ):
+            auth._fields_fingerprint.cache_clear()
+            try:
+                self.assertNotEqual(snapshot_key(self.driver.pk), key)
+            finally:
+                auth._fields_fingerprint.cache_clear()
+
+    def test_toggle_ignores_stale_snapshot(self):
+        self.client.get(reverse("taxi:index"))
+        # Unassigned behind the cache's back, e.g. by another process.
+        Car.drivers.through.objects.filter(car=self.car).delete()
+        self.client.get(reverse("taxi:toggle-car-assign", args=[self.car.pk]))
+        self.assertTrue(self.car.drivers.filter(pk=self.driver.pk).exists())
+
+    def test_toggle_missing_car(self):
+        response = self.client.get(
+            reverse("taxi:toggle-car-assign", args=[self.other_car.pk + 1])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_password_change_logs_out(self):
+        self.client.get(reverse("taxi:index"))
+        driver = Driver.objects.get(pk=self.driver.pk)
+        driver.set_password("changed12345")
+        driver.save()
+        response = self.client.get(reverse("taxi:car-list"))
+        self.assertEqual(response.status_code, 302)
+
+    def test_deactivated_driver_is_logged_out(self):
+        self.client.get(reverse("taxi:index"))
+        driver = Driver.objects.get(pk=self.driver.pk)
+        driver.is_active = False
+        driver.save()
+        response = self.client.get(reverse("taxi:car-list"))
+        self.assertEqual(response.status_code, 302)
+
+
+class TemplateProfileTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.driver = create_driver()
+        create_fleet(manufacturers=1, cars_per_manufacturer=3, drivers=2)
+
+    def setUp(self):
+        self.client.force_login(self.driver)
+
+    @override_settings(TEMPLATE_TIMING=True, INTERNAL_IPS=["127.0.0.1"])
+    def test_server_timing_lists_templates(self):
+        response = self.client.get(reverse("taxi:car-list"))
+        header = response["Server-Timing"]
+        self.assertTrue(header.startswith("tpl;dur="))
+        for name in (
+            "taxi/car_list.html", "base.html", "includes/sidebar.html"
+        ):
+            self.assertIn(f'desc="{name} x1"', header)
+
+    @override_settings(TEMPLATE_TIMING=True, INTERNAL_IPS=[])
+    def test_timing_is_only_logged_for_other_clients(self):
+        with self.assertLogs("taxi.templating", "INFO") as logs:
+            response = self.client.get(reverse("taxi:car-list"))
+        self.assertFalse(response.has_header("Server-Timing"))
+        self.assertIn('desc="taxi/car_list.html x1"', logs.output[0])
+
+        self.driver.is_staff = True
+        self.driver.save()
+        response = self.client.get(reverse("taxi:car-list"))
+        self.assertIn("taxi/car_list.html", response["Server-Timing"])
+
+    @override_settings(TEMPLATE_TIMING=False)
+    def test_timing_can_be_disabled(self):
+        response = self.client.get(reverse("taxi:car-list"))
+        self.assertFalse(response.has_header("Server-Timing"))
+
+    def test_warm_up_fills_cached_loader(self):
+        compiled, _ = templating.warm_up()
+        loader = engines["django"].engine.template_loaders[0]
+        self.assertGreater(compiled, 20)
+        self.assertIn("taxi/car_form.html", loader.get_template_cache)
+        self.assertIn("includes/sidebar.html", loader.get_template_cache)
+
+    def test_sidebar_navigation_is_cached(self):
+        key = make_template_fragment_key("sidebar-nav")
+        self.client.get(reverse("taxi:index"))
+        self.assertIn("All cars", cache.get(key))
+        cache.set(key, "cached navigation")
+        self.assertContains(
+            self.client.get(reverse("taxi:index")), "cached navigation"
+        )
+
+
+class StartupTests(TestCase):
+    def import_settings(self, module):
+        name = f"taxi_service.settings.{module}"
+        sys.modules.pop(name, None)
+        return importlib.import_module(name)
+
+    def test_debug_toolbar_only_in_dev(self):
+        for module, expected in (("dev", True), ("prod", False),
+                                 ("test", False)):
+            with mock.patch.dict(
+                os.environ,
+                DJANGO_SECRET_KEY="secret",
+                DJANGO_REDIS_URL="redis://localhost:6379",
+            ):
+                settings_module = self.import_settings(module)
+            self.assertEqual(
+                "debug_toolbar" in settings_module.INSTALLED_APPS, expected
+            )
+            self.assertEqual(
+                any(
+                    middleware.startswith("debug_toolbar.")
+                    for middleware in settings_module.MIDDLEWARE
+                ),
+                expected,
+            )
+
+    def test_warm_up_runs_requested_steps(self):
+        timings = startup.warm_up(["urls", "templates", "database"])
+        self.assertEqual(list(timings), ["urls", "templates", "database"])
+
+    def test_prod_requires_secret_key(self):
+        environ = {
+            name: value for name, value in os.environ.items()
+            if name != "DJANGO_SECRET_KEY"
+        }
+        with mock.patch.dict(os.environ, environ, clear=True):
+            with self.assertRaises(ImproperlyConfigured):
+                self.import_settings("prod")
+
+    def test_warm_up_skips_steps_failing_on_database(self):
+        def unmigrated():
+            raise OperationalError("no such table: taxi_car")
+
+        with mock.patch.dict(startup.WARMUP_STEPS, unmigrated=unmigrated):
+            with self.assertLogs("taxi.startup", "WARNING"):
+                timings = startup.warm_up(["unmigrated", "urls"])
+        self.assertEqual(list(timings), ["urls"])
+
+    def test_parse_importtime(self):
+        imports = startup.parse_importtime([
+            "import time: self [us] | cumulative | imported package",
+            "import time:       120 |        120 |     _io",
+            "import time:      2500 |       2620 | django",
+            "Traceback (most recent call last):",
+        ])
+        self.assertEqual(
+            imports,
+            [("_io", 0.00012, 0.00012, 2), ("django", 0.0025, 0.00262, 0)],
+        )
+
+    def test_startup_profile_command(self):
+        out = StringIO()
+        call_command(
+            "startup_profile",
+            "--target-settings=taxi_service.settings.test",
+            "--no-warmup",
+            "--limit=3",
+            stdout=out,
+        )
+        report = out.getvalue()
+        self.assertIn("Start-up with taxi_service.settings.test", report)
+        self.assertIn("django.setup()", report)
+        self.assertRegex(report, r"\ntaxi +[\d.]+ +[\d.]+ +[\d.]+\n")
+
+    def test_startup_profile_defaults_to_prod(self):
+        environ = {
+            name: value for name, value in os.environ.items()
+            if name not in ("DJANGO_SECRET_KEY", "DJANGO_REDIS_URL")
+        }
+        out = StringIO()
+        with mock.patch.dict(os.environ, environ, clear=True):
+            call_command("startup_profile", "--no-warmup", stdout=out)
+        self.assertIn(
+            "Start-up with taxi_service.settings.prod", out.getvalue()
+        )
+
+
+class MaintenanceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fleet = create_fleet(
+            manufacturers=2, cars_per_manufacturer=5, drivers=3
+        )
+
+    def call(self, *args):
+        out = StringIO()
+        call_command(*args, "--batch-size=2", "--pause-ms=0", stdout=out)
+        return out.getvalue()
+
+    def test_batches_are_resized_to_lock_limit(self):
+        runner = BatchRunner(batch_size=100, max_lock_ms=50)
+        runner.resize(lock_ms=100)
+        self.assertEqual(runner.batch_size, 40)
+        runner.resize(lock_ms=1)
+        self.assertEqual(runner.batch_size, 80)
+
+    def test_purge_sessions_keeps_live_ones(self):
+        for expiry in (-60, -60, -60, 60):
+            session = SessionStore()
+            session.set_expiry(expiry)
+            session.create()
+        output = self.call("purge_sessions")
+        self.assertIn("Expired sessions: 3 rows in", output)
+        self.assertEqual(Session.objects.count(), 1)
+
+    def test_purge_orphans(self):
+        through = Car.drivers.through
+        orphan = through.objects.create(
+            car_id=self.fleet.cars[-1].pk + 100,
+            driver_id=self.fleet.drivers[0].pk,
+        )
+        links = through.objects.count()
+        self.call("purge_orphans")
+        self.assertFalse(through.objects.filter(pk=orphan.pk).exists())
+        self.assertEqual(through.objects.count(), links - 1)
+
+    def test_chunked_delete_manufacturer(self):
+        manufacturer = self.fleet.manufacturers[0]
+        output = self.call("chunked_delete", "manufacturer", manufacturer.pk)
+        # Five cars and their ten assignments.
+        self.assertIn("Cars: 15 rows in", output)
+        self.assertFalse(Car.objects.filter(manufacturer=manufacturer))
+        self.assertFalse(
+            Manufacturer.objects.filter(pk=manufacturer.pk).exists()
+        )
+        self.assertEqual(
+            AssignmentEvent.objects.filter(action="unassigned").count(), 10
+        )
+
+    def test_chunked_delete_driver(self):
+        driver = self.fleet.drivers[0]
+        assignments = driver.cars.count()
+        self.call("chunked_delete", "driver", driver.pk)
+        self.assertFalse(Driver.objects.filter(pk=driver.pk).exists())
+        self.assertEqual(
+            AssignmentEvent.objects.filter(driver_id=driver.pk).count(),
+            assignments,
+        )
+
+    def test_time_box_stops_before_deleting(self):
+        manufacturer = self.fleet.manufacturers[0]
+        output = self.call(
+            "chunked_delete", "manufacturer", manufacturer.pk,
+            "--max-seconds=0",
+        )
+        self.assertIn("run again to continue", output)
+        self.assertTrue(
+            Manufacturer.objects.filter(pk=manufacturer.pk).exists()
+        )
+
+
+class OptimisticLockingTests(TestCase):
+    def setUp(self):
+        self.manufacturer = create_manufacturer()
+        self.drivers = [create_driver() for _ in range(3)]
+        self.car = create_car(
+            manufacturer=self.manufacturer,
+            model="Camry",
+            drivers=self.drivers[:1],
+        )
+        self.client.force_login(self.drivers[0])
+        self.url = reverse("taxi:car-update", args=[self.car.pk])
+
+    def submit(self, form, **changes):
+        data = {
+            name: form[name].value()
+            for name in ("model", "manufacturer", "version", "drivers_seen")
+        }
+        data["drivers"] = [driver.pk for driver in self.drivers[:1]]
+        data.update(changes)
+        return self.client.post(self.url, data)
+
+    def test_save_checks_and_bumps_version(self):
+        stale = Car.objects.get(pk=self.car.pk)
+        self.car.model = "Corolla"
+        self.car.expect_version(self.car.version)
+        self.car.save()
+        self.assertEqual(self.car.version, 2)
+        stale.model = "Prius"
+        stale.expect_version(stale.version)
+        with self.assertRaises(VersionConflictError), transaction.atomic():
+            stale.save()
+        self.car.refresh_from_db()
+        self.assertEqual(self.car.model, "Corolla")
+
+    def test_unchecked_save_bumps_version(self):
+        stale = Car.objects.get(pk=self.car.pk)
+        self.car.save()
+        stale.model = "Prius"
+        stale.save()
+        self.assertEqual(stale.version, 3)
+
+    def test_admin_saves_over_concurrent_change(self):
+        self.client.force_login(
+            create_driver(is_staff=True, is_superuser=True)
+        )
+        save_model = CarAdmin.save_model
+
+        def save_after_concurrent_change(*args):
+            Car.objects.filter(pk=self.car.pk).update(
+                version=F("version") + 1
+            )
+            save_model(*args)
+
+        with mock.patch.object(
+            CarAdmin, "save_model", save_after_concurrent_change
+        ):
+            response = self.client.post(
+                reverse("admin:taxi_car_change", args=[self.car.pk]),
+                {
+                    "model": "Prius",
+                    "manufacturer": self.manufacturer.pk,
+                    "drivers": [self.drivers[0].pk],
+                },
+            )
+        self.assertRedirects(response, reverse("admin:taxi_car_changelist"))
+        self.car.refresh_from_db()
+        self.assertEqual((self.car.model, self.car.version), ("Prius", 3))
+
+    def test_partial_save_is_not_checked(self):
+        stale = Driver.objects.get(pk=self.drivers[0].pk)
+        self.drivers[0].save()
+        stale.last_login = timezone.now()
+        stale.save(update_fields=["last_login"])
+        stale.refresh_from_db()
+        self.assertEqual(stale.version, 2)
+
+    def test_stale_form_shows_conflict(self):
+        form = self.client.get(self.url).context["form"]
+        Car.objects.filter(pk=self.car.pk).update(model="Corolla")
+        self.car.refresh_from_db()
+        self.car.save()
+
+        response = self.submit(form, model="Prius")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.context["changes"], [
+            ("Model", "Prius", "Corolla"),
+        ])
+        self.car.refresh_from_db()
+        self.assertEqual(self.car.model, "Corolla")
+
+        rebased = response.context["form"]
+        self.assertEqual(rebased["model"].value(), "Prius")
+        response = self.submit(rebased)
+        self.assertRedirects(response, reverse("taxi:car-list"))
+        self.car.refresh_from_db()
+        self.assertEqual((self.car.model, self.car.version), ("Prius", 3))
+
+    def test_bulk_manufacturer_change_bumps_version(self):
+        form = self.client.get(self.url).context["form"]
+        bulk.change_manufacturer([self.car.pk], create_manufacturer())
+        response = self.submit(form)
+        self.assertEqual(response.status_code, 409)
+
+    def test_only_changed_drivers_are_written(self):
+        form = self.client.get(self.url).context["form"]
+        # Assigned by someone else while the form was open.
+        self.car.drivers.add(self.drivers[1])
+
+        response = self.submit(
+            form, drivers=[self.drivers[2].pk]
+        )
+        self.assertRedirects(response, reverse("taxi:car-list"))
+        self.assertEqual(
+            set(self.car.drivers.all()), {self.drivers[1], self.drivers[2]}
+        )
+
+    def test_version_is_required_for_updates_only(self):
+        data = {
+            "model": "Prius",
+            "manufacturer": self.manufacturer.pk,
+            "drivers": [self.drivers[0].pk],
+        }
+        form = CarForm(data=data, instance=self.car)
+        self.assertFalse(form.is_valid())
+        self.assertIn("version", form.errors)
+        self.assertTrue(CarForm(data=data).is_valid())
+
+    def test_stale_license_update_shows_conflict(self):
+        driver = self.drivers[1]
+        url = reverse("taxi:driver-update", args=[driver.pk])
+        form = self.client.get(url).context["form"]
+        driver.license_number = "NEW12345"
+        driver.save()
+
+        response = self.client.post(
+            url,
+            {"license_number": "OLD12345", "version": form["version"].value()},
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertContains(response, "NEW12345", status_code=409)
+        driver.refresh_from_db()
+        self.assertEqual(driver.license_number, "NEW12345")
@@ -1,13 +1,17 @@
 from django.urls import path
 
+from .ratelimit import ratelimit, searching
 from .views import (
     index,
+    ReportView,
     CarListView,
+    CarBulkActionView,
     CarDetailView,
     CarCreateView,
     CarUpdateView,
     CarDeleteView,
     DriverListView,
+    DriverBulkActionView,
     DriverDetailView,
     DriverCreateView,
     DriverLicenseUpdateView,
@@ -17,57 +21,126 @@ from .views import (
     ManufacturerUpdateView,
     ManufacturerDeleteView,
     toggle_assign_to_car,
+    ingest_car_positions,
+    nearest_cars,
 )
 
+SEARCH_RATE = "60/m"
+WRITE_RATE = "30/m"
+WRITE_METHODS = ("POST",)
+
 urlpatterns = [
     path("", index, name="index"),
+    path("reports/", ReportView.as_view(), name="report"),
     path(
         "manufacturers/",
-        ManufacturerListView.as_view(),
+        ratelimit(
+            ManufacturerListView.as_view(), SEARCH_RATE, when=searching
+        ),
         name="manufacturer-list",
     ),
     path(
         "manufacturers/create/",
-        ManufacturerCreateView.as_view(),
+        ratelimit(
+            ManufacturerCreateView.as_view(),
+            WRITE_RATE,
+            methods=WRITE_METHODS,
+        ),
         name="manufacturer-create",
     ),
     path(
         "manufacturers/<int:pk>/update/",
-        ManufacturerUpdateView.as_view(),
+        ratelimit(
+            ManufacturerUpdateView.as_view(),
+            WRITE_RATE,
+            methods=WRITE_METHODS,
+        ),
         name="manufacturer-update",
     ),
     path(
         "manufacturers/<int:pk>/delete/",
-        ManufacturerDeleteView.as_view(),
+        ratelimit(
+            ManufacturerDeleteView.as_view(),
+            WRITE_RATE,
+            methods=WRITE_METHODS,
+        ),
         name="manufacturer-delete",
     ),
-    path("cars/", CarListView.as_view(), name="car-list"),
+    path(
+        "cars/",
+        ratelimit(CarListView.as_view(), SEARCH_RATE, when=searching),
+        name="car-list",
+    ),
     path("cars/<int:pk>/", CarDetailView.as_view(), name="car-detail"),
-    path("cars/create/", CarCreateView.as_view(), name="car-create"),
-    path("cars/<int:pk>/update/", CarUpdateView.as_view(), name="car-update"),
-    path("cars/<int:pk>/delete/", CarDeleteView.as_view(), name="car-delete"),
+    path(
+        "cars/bulk/",
+        ratelimit(CarBulkActionView.as_view(), WRITE_RATE),
+        name="car-bulk",
+    ),
+    path(
+        "cars/positions/",
+        ratelimit(ingest_car_positions, "120/m"),
+        name="car-positions",
+    ),
+    path("cars/nearest/", nearest_cars, name="car-nearest"),
+    path(
+        "cars/create/",
+        ratelimit(CarCreateView.as_view(), WRITE_RATE, methods=WRITE_METHODS),
+        name="car-create",
+    ),
+    path(
+        "cars/<int:pk>/update/",
+        ratelimit(CarUpdateView.as_view(), WRITE_RATE, methods=WRITE_METHODS),
+        name="car-update",
+    ),
+    path(
+        "cars/<int:pk>/delete/",
+        ratelimit(CarDeleteView.as_view(), WRITE_RATE, methods=WRITE_METHODS),
+        name="car-delete",
+    ),
     path(
         "cars/<int:pk>/toggle-assign/",
-        toggle_assign_to_car,
+        ratelimit(toggle_assign_to_car, "20/m"),
         name="toggle-car-assign",
     ),
-    path("drivers/", DriverListView.as_view(), name="driver-list"),
+    path(
+        "drivers/",
+        ratelimit(DriverListView.as_view(), SEARCH_RATE, when=searching),
+        name="driver-list",
+    ),
     path(
         "drivers/<int:pk>/", DriverDetailView.as_view(), name="driver-detail"
     ),
+    path(
+        "drivers/bulk/",
+        ratelimit(DriverBulkActionView.as_view(), WRITE_RATE),
+        name="driver-bulk",
+    ),
     path("drivers/", DriverListView.as_view(), name="driver-list"),
     path(
         "drivers/<int:pk>/", DriverDetailView.as_view(), name="driver-detail"
     ),
-    path("drivers/create/", DriverCreateView.as_view(), name="driver-create"),
+    path(
+        "drivers/create/",
+        ratelimit(
+            DriverCreateView.as_view(), WRITE_RATE, methods=WRITE_METHODS
+        ),
+        name="driver-create",
+    ),
     path(
         "drivers/<int:pk>/update/",
-        DriverLicenseUpdateView.as_view(),
+        ratelimit(
+            DriverLicenseUpdateView.as_view(),
+            WRITE_RATE,
+            methods=WRITE_METHODS,
+        ),
         name="driver-update",
     ),
     path(
         "drivers/<int:pk>/delete/",
-        DriverDeleteView.as_view(),
+        ratelimit(
+            DriverDeleteView.as_view(), WRITE_RATE, methods=WRITE_METHODS
+        ),
         name="driver-delete",
     ),
 ]
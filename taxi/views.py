@@ -1,13 +1,35 @@
+import json
+
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseRedirect
-from django.shortcuts import render
+from django.http import HttpResponseRedirect, JsonResponse
+from django.shortcuts import get_object_or_404, render
 from django.urls import reverse_lazy
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.views import generic
+from django.views.decorators.http import require_GET, require_POST
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import transaction
 from django.db.models import Q
 
-from .models import Driver, Car, Manufacturer
-from .forms import DriverCreationForm, DriverLicenseUpdateForm, CarForm
+from . import bulk
+from .models import (
+    Driver,
+    Car,
+    Manufacturer,
+    CountryReport,
+    FleetReport,
+    ManufacturerReport,
+    VersionConflictError,
+)
+from .forms import (
+    DriverCreationForm,
+    DriverLicenseUpdateForm,
+    CarForm,
+    CarBulkActionForm,
+    DriverBulkActionForm,
+)
+from .spatial import get_car_index
 
 
 @login_required
@@ -31,6 +53,20 @@ def index(request):
     return render(request, "taxi/index.html", context=context)
 
 
+class ReportView(LoginRequiredMixin, generic.TemplateView):
+    """Fleet report read from the precomputed tables only; run
+    ``manage.py refresh_reports`` to update them."""
+
+    template_name = "taxi/report.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["fleet"] = FleetReport.objects.filter(pk=1).first()
+        context["manufacturer_reports"] = ManufacturerReport.objects.all()
+        context["country_reports"] = CountryReport.objects.all()
+        return context
+
+
 class ManufacturerListView(LoginRequiredMixin, generic.ListView):
     model = Manufacturer
     context_object_name = "manufacturer_list"
@@ -83,6 +119,7 @@ class CarListView(LoginRequiredMixin, generic.ListView):
 
 class CarDetailView(LoginRequiredMixin, generic.DetailView):
     model = Car
+    queryset = Car.objects.select_related("manufacturer")
 
 
 class CarCreateView(LoginRequiredMixin, generic.CreateView):
@@ -91,7 +128,45 @@ class CarCreateView(LoginRequiredMixin, generic.CreateView):
     success_url = reverse_lazy("taxi:car-list")
 
 
-class CarUpdateView(LoginRequiredMixin, generic.UpdateView):
+class VersionConflictMixin:
+    """For update views of versioned models: if the row changed since the
+    form was shown, nothing is saved and a page listing the fields that
+    differ offers to save the user's values over the latest version."""
+
+    conflict_template_name = "taxi/version_conflict.html"
+
+    def form_valid(self, form):
+        try:
+            with transaction.atomic():
+                return super().form_valid(form)
+        except VersionConflictError:
+            return self.version_conflict(form)
+
+    def version_conflict(self, form):
+        current = self.get_object()
+        columns = {field.name for field in current._meta.concrete_fields}
+        changes = [
+            (form[name].label, value, getattr(current, name))
+            for name, value in form.cleaned_data.items()
+            if name in columns
+            and name != "version"
+            and value != getattr(current, name)
+        ]
+        return render(
+            self.request,
+            self.conflict_template_name,
+            {
+                "object": current,
+                "form": form.rebase(current),
+                "changes": changes,
+            },
+            status=409,
+        )
+
+
+class CarUpdateView(
+    LoginRequiredMixin, VersionConflictMixin, generic.UpdateView
+):
     model = Car
     form_class = CarForm
     success_url = reverse_lazy("taxi:car-list")
@@ -102,6 +177,79 @@ class CarDeleteView(LoginRequiredMixin, generic.DeleteView):
     success_url = reverse_lazy("taxi:car-list")
 
 
+class BulkActionView(LoginRequiredMixin, generic.FormView):
+    """Apply an action to the rows selected on a list page.
+
+    The first POST comes from the list page and shows a confirmation page
+    with counts; the action runs once the confirmation is posted.
+    """
+
+    http_method_names = ["post"]
+    template_name = "taxi/bulk_confirm.html"
+    model = None
+
+    def form_valid(self, form):
+        if not form.cleaned_data["ids"]:
+            return HttpResponseRedirect(self.get_success_url())
+        if not form.cleaned_data["confirm"]:
+            return self.render_to_response(self.get_context_data(form=form))
+        with transaction.atomic():
+            # The selection may name rows deleted since the list was shown.
+            data = dict(form.cleaned_data, ids=set(
+                self.model.objects.filter(
+                    id__in=form.cleaned_data["ids"]
+                ).values_list("id", flat=True)
+            ))
+            self.perform(data)
+        return HttpResponseRedirect(self.get_success_url())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        form = context["form"]
+        ids = form.cleaned_data.get("ids", set())
+        context["verbose_name_plural"] = self.model._meta.verbose_name_plural
+        context["action_label"] = dict(form.ACTION_CHOICES).get(
+            form["action"].value()
+        )
+        context["selected_count"] = self.model.objects.filter(
+            id__in=ids
+        ).count()
+        context["assignment_count"] = Car.drivers.through.objects.filter(
+            **{f"{self.model._meta.model_name}_id__in": ids}
+        ).count()
+        return context
+
+
+class CarBulkActionView(BulkActionView):
+    model = Car
+    form_class = CarBulkActionForm
+    success_url = reverse_lazy("taxi:car-list")
+
+    def perform(self, data):
+        action = data["action"]
+        if action == "delete":
+            bulk.delete_cars(data["ids"])
+        elif action == "change_manufacturer":
+            bulk.change_manufacturer(data["ids"], data["manufacturer"])
+        else:
+            driver_ids = {driver.id for driver in data["drivers"]}
+            getattr(bulk, action)(data["ids"], driver_ids)
+
+
+class DriverBulkActionView(BulkActionView):
+    model = Driver
+    form_class = DriverBulkActionForm
+    success_url = reverse_lazy("taxi:driver-list")
+
+    def perform(self, data):
+        action = data["action"]
+        if action == "delete":
+            bulk.delete_drivers(data["ids"])
+        else:
+            car_ids = {car.id for car in data["cars"]}
+            getattr(bulk, action)(car_ids, data["ids"])
+
+
 class DriverListView(LoginRequiredMixin, generic.ListView):
     model = Driver
     paginate_by = 5
@@ -129,7 +277,9 @@ class DriverCreateView(LoginRequiredMixin, generic.CreateView):
     form_class = DriverCreationForm
 
 
-class DriverLicenseUpdateView(LoginRequiredMixin, generic.UpdateView):
+class DriverLicenseUpdateView(
+    LoginRequiredMixin, VersionConflictMixin, generic.UpdateView
+):
     model = Driver
     form_class = DriverLicenseUpdateForm
     success_url = reverse_lazy("taxi:driver-list")
@@ -142,11 +292,115 @@ class DriverDeleteView(LoginRequiredMixin, generic.DeleteView):
 
 @login_required
 def toggle_assign_to_car(request, pk):
-    driver = Driver.objects.get(id=request.user.id)
-    if (
-        Car.objects.get(id=pk) in driver.cars.all()
-    ):  # probably could check if car exists
-        driver.cars.remove(pk)
+    get_object_or_404(Car.objects.only("id"), pk=pk)
+    # Decide from the database: the cached assigned_car_ids can be stale.
+    if request.user.cars.filter(pk=pk).exists():
+        request.user.cars.remove(pk)
     else:
-        driver.cars.add(pk)
+        request.user.cars.add(pk)
     return HttpResponseRedirect(reverse_lazy("taxi:car-detail", args=[pk]))
+
+
+def _parse_position(position):
+    latitude = float(position["lat"])
+    longitude = float(position["lon"])
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("Coordinates out of range")
+    timestamp = position.get("timestamp")
+    seen_at = parse_datetime(timestamp) if timestamp else timezone.now()
+    if seen_at is None:
+        raise ValueError("Invalid timestamp")
+    if timezone.is_naive(seen_at):
+        seen_at = timezone.make_aware(seen_at)
+    return int(position["car"]), latitude, longitude, seen_at
+
+
+@login_required
+@require_POST
+def ingest_car_positions(request):
+    """Store a batch of ``{"car", "lat", "lon", "timestamp"}`` positions.
+
+    Positions older than the one already stored for a car are ignored, so
+    batches may arrive out of order.
+    """
+    try:
+        positions = json.loads(request.body)["positions"]
+        parsed = {}
+        for position in positions:
+            car_id, latitude, longitude, seen_at = _parse_position(position)
+            if car_id not in parsed or parsed[car_id][2] < seen_at:
+                parsed[car_id] = (latitude, longitude, seen_at)
+    except (KeyError, TypeError, ValueError) as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    cars = list(
+        Car.objects.filter(id__in=parsed).only(
+            "id", "manufacturer_id", "location_updated_at"
+        )
+    )
+    updated = []
+    for car in cars:
+        latitude, longitude, seen_at = parsed[car.id]
+        if car.location_updated_at and car.location_updated_at >= seen_at:
+            continue
+        car.latitude = latitude
+        car.longitude = longitude
+        car.location_updated_at = seen_at
+        updated.append(car)
+    Car.objects.bulk_update(
+        updated, ["latitude", "longitude", "location_updated_at"]
+    )
+
+    get_car_index().put_many([
+        (car.id, car.latitude, car.longitude, car.manufacturer_id)
+        for car in updated
+    ])
+
+    return JsonResponse(
+        {"updated": len(updated), "ignored": len(positions) - len(updated)}
+    )
+
+
+@login_required
+@require_GET
+def nearest_cars(request):
+    """Closest located cars to ``lat``/``lon``; only cars without drivers
+    unless ``include_assigned`` is set."""
+    try:
+        latitude = float(request.GET["lat"])
+        longitude = float(request.GET["lon"])
+        limit = min(int(request.GET.get("limit", 5)), 50)
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        manufacturer_id = request.GET.get("manufacturer")
+        manufacturer_id = int(manufacturer_id) if manufacturer_id else None
+    except (KeyError, ValueError) as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    nearest = get_car_index().nearest(
+        latitude,
+        longitude,
+        limit=limit,
+        manufacturer_id=manufacturer_id,
+        unassigned_only=not request.GET.get("include_assigned"),
+    )
+    cars = Car.objects.select_related("manufacturer").in_bulk(
+        [car_id for car_id, _ in nearest]
+    )
+    return JsonResponse(
+        {
+            "cars": [
+                {
+                    "id": car_id,
+                    "model": cars[car_id].model,
+                    "manufacturer": cars[car_id].manufacturer.name,
+                    "lat": cars[car_id].latitude,
+                    "lon": cars[car_id].longitude,
+                    "location_updated_at": cars[car_id].location_updated_at,
+                    "distance_km": round(distance, 3),
+                }
+                for car_id, distance in nearest
+                if car_id in cars
+            ]
+        }
+    )
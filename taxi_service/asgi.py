@@ -11,6 +11,15 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "taxi_service.settings")
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "taxi_service.settings.prod")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up: the event stream and the warm-up need
+# the app registry.
+from taxi.events import EventStreamApp  # noqa: E402
+from taxi.startup import warm_up  # noqa: E402
+
+warm_up()
+
+application = EventStreamApp(django_application)
@@ -1,7 +1,8 @@
 """
-Django settings for taxi_service project.
+Django settings for taxi_service project, shared by every environment.
 
-Generated by "django-admin startproject" using Django 4.0.2.
+Generated by "django-admin startproject" using Django 4.0.2. Environments
+extend it: ``dev`` (manage.py), ``prod`` (wsgi.py/asgi.py) and ``test``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.0/topics/settings/
@@ -13,7 +14,7 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / "subdir".
-BASE_DIR = Path(__file__).resolve().parent.parent
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
 
 # Quick-start development settings - unsuitable for production
@@ -25,14 +26,10 @@ SECRET_KEY = (
 )
 
 # SECURITY WARNING: don"t run with debug turned on in production!
-DEBUG = True
+DEBUG = False
 
 ALLOWED_HOSTS = []
 
-INTERNAL_IPS = [
-    "127.0.0.1",
-]
-
 # Application definition
 
 INSTALLED_APPS = [
@@ -42,7 +39,6 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
-    "debug_toolbar",
     "crispy_bootstrap4",
     "crispy_forms",
     "taxi",
@@ -50,7 +46,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
+    "taxi.nplusone.QueryInspectionMiddleware",
+    "taxi.templating.TemplateTimingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -65,7 +62,6 @@ TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
-        "APP_DIRS": True,
         "OPTIONS": {
             "context_processors": [
                 "django.template.context_processors.debug",
@@ -73,12 +69,77 @@ TEMPLATES = [
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
             ],
+            # Compiled templates are kept for the life of the process;
+            # runserver's autoreloader resets them when a file changes.
+            "loaders": [
+                (
+                    "django.template.loaders.cached.Loader",
+                    [
+                        "django.template.loaders.filesystem.Loader",
+                        "django.template.loaders.app_directories.Loader",
+                    ],
+                ),
+            ],
         },
     },
 ]
 
+# What the WSGI/ASGI application loads before serving its first request,
+# see taxi/startup.py. With a pre-forking server that imports the
+# application before forking, workers inherit all of it.
+STARTUP_WARMUP = ()
+
+# Log render time per template; internal IPs and staff also get it in a
+# Server-Timing response header.
+TEMPLATE_TIMING = True
+
 CRISPY_TEMPLATE_PACK = "bootstrap4"
 
+# N+1 query detection, see taxi/nplusone.py. The test runner enables it
+# and turns every reported problem into a test failure.
+
+TEST_RUNNER = "taxi.test_runner.TaxiTestRunner"
+
+QUERY_INSPECTION_ENABLED = False
+
+QUERY_INSPECTION_RAISE = False
+
+QUERY_INSPECTION_THRESHOLD = 3
+
+QUERY_BUDGETS = {
+    "taxi:index": 8,
+    "taxi:manufacturer-list": 4,
+    "taxi:car-list": 4,
+    "taxi:car-detail": 4,
+    "taxi:driver-list": 4,
+    "taxi:driver-detail": 5,
+}
+
+# Nearest-car lookups, see taxi/spatial.py. Cells are CAR_INDEX_CELL_SIZE
+# degrees wide (about 1 km); each process rebuilds its index from the
+# database after CAR_INDEX_MAX_AGE seconds.
+
+CAR_INDEX_CELL_SIZE = 0.01
+
+CAR_INDEX_MAX_AGE = 60
+
+# Token-bucket rate limits, declared per URL in taxi/urls.py. Use a shared
+# cache (memcached, Redis) in production so all workers share the buckets.
+
+RATE_LIMIT_ENABLED = True
+
+RATE_LIMIT_CACHE = "ratelimit"
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "ratelimit": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "ratelimit",
+    },
+}
+
 WSGI_APPLICATION = "taxi_service.wsgi.application"
 
 
@@ -117,6 +178,14 @@ AUTH_PASSWORD_VALIDATORS = [
 
 AUTH_USER_MODEL = "taxi.Driver"
 
+AUTHENTICATION_BACKENDS = ["taxi.auth.CachedModelBackend"]
+
+# request.user is served from a snapshot in this cache (see taxi/auth.py).
+# Use a cache shared by all processes in production, otherwise other
+# processes see changes to a user only after the timeout.
+USER_CACHE = "default"
+USER_CACHE_TIMEOUT = 60
+
 LOGIN_REDIRECT_URL = "/"
 LOGIN_URL = "login"
 
@@ -0,0 +1,23 @@
+"""Settings for local development, used by manage.py."""
+from taxi_service.settings.base import *  # noqa: F401, F403
+from taxi_service.settings.base import INSTALLED_APPS, MIDDLEWARE
+
+DEBUG = True
+
+INTERNAL_IPS = [
+    "127.0.0.1",
+]
+
+INSTALLED_APPS = INSTALLED_APPS + ["debug_toolbar"]
+
+MIDDLEWARE = MIDDLEWARE.copy()
+MIDDLEWARE.insert(
+    MIDDLEWARE.index("django.contrib.sessions.middleware.SessionMiddleware"),
+    "debug_toolbar.middleware.DebugToolbarMiddleware",
+)
+
+# The toolbar only looks for APP_DIRS; app_directories.Loader is listed in
+# the template loaders instead.
+SILENCED_SYSTEM_CHECKS = ["debug_toolbar.W006"]
+
+QUERY_INSPECTION_ENABLED = True
@@ -0,0 +1,51 @@
+"""Settings for serving the project, used by wsgi.py and asgi.py.
+
+The secret key, the Redis server and the allowed hosts come from the
+``DJANGO_SECRET_KEY`` and ``DJANGO_REDIS_URL`` (both required) and
+``DJANGO_ALLOWED_HOSTS`` (comma-separated) environment variables.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from taxi_service.settings.base import *  # noqa: F401, F403
+from taxi_service.settings.base import CACHES
+
+
+def required(name):
+    try:
+        return os.environ[name]
+    except KeyError:
+        raise ImproperlyConfigured(f"Set the {name} environment variable.")
+
+
+SECRET_KEY = required("DJANGO_SECRET_KEY")
+
+REDIS_URL = required("DJANGO_REDIS_URL")
+
+ALLOWED_HOSTS = os.environ.get(
+    "DJANGO_ALLOWED_HOSTS", "localhost,127.0.0.1"
+).split(",")
+
+STARTUP_WARMUP = ("urls", "templates", "database", "car_index")
+
+CACHES = {
+    **CACHES,
+    # Shared by all workers, so a client gets the configured rate in total
+    # rather than once per worker.
+    "ratelimit": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+        "KEY_PREFIX": "ratelimit",
+    },
+    # User snapshots must be dropped for every worker at once, or a
+    # password change or deactivation reaches the other workers only after
+    # USER_CACHE_TIMEOUT.
+    "users": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+        "KEY_PREFIX": "users",
+    },
+}
+
+USER_CACHE = "users"
@@ -0,0 +1,17 @@
+"""Settings for running the test suite quickly.
+
+Usage: python manage.py test --settings=taxi_service.settings.test --parallel
+"""
+from taxi_service.settings.base import *  # noqa: F401, F403
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+        "TEST": {"NAME": ":memory:"},
+    }
+}
+
+PASSWORD_HASHERS = [
+    "django.contrib.auth.hashers.MD5PasswordHasher",
+]
@@ -11,6 +11,11 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "taxi_service.settings")
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "taxi_service.settings.prod")
 
 application = get_wsgi_application()
+
+# Imported after Django is set up: the warm-up needs the app registry.
+from taxi.startup import warm_up  # noqa: E402
+
+warm_up()